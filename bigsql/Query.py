@@ -14,6 +14,68 @@ class Query(object):
         """
         return Sql.Sql.SELECTFROM(self.table_name).all()
 
+    async def all_async(self):
+        """
+        Awaitable counterpart to all.
+        """
+        return await Sql.Sql.SELECTFROM(self.table_name).all_async()
+
+    def stream(self, batch_size=1000, track=True):
+        """
+        Iterates over every model in the table in constant memory
+        (see Sql.iter).
+
+        :param batch_size: number of rows to fetch at a time
+        :param track: add models to the session
+        :return: generator of models
+        """
+        return Sql.Sql.SELECTFROM(self.table_name).iter(batch_size, track)
+
+    def preload(self, *relationships):
+        """
+        Loads relationships for every model in the result up front,
+        with one query per relationship (see Sql.preload).
+
+        db.query('Person').preload('photos').all()
+
+        :param relationships: names of relationships (like photos)
+        :return: Sql object
+        """
+        return Sql.Sql.SELECTFROM(self.table_name).preload(*relationships)
+
+    def paginate(self, by=None, page_size=1000):
+        """
+        Iterates over every model in the table a page at a time,
+        in order of by (see Sql.paginate).
+
+        for photos in db.query('Photo').paginate(by='photoID', page_size=1000):
+            ...
+
+        :param by: unique column to page through (primary key by default)
+        :param page_size: number of models on each page
+        :return: generator of lists of models
+        """
+        return Sql.Sql.SELECTFROM(self.table_name).paginate(by, page_size)
+
+    def count(self):
+        """
+        Counts the rows in the table on the server (see Sql.aggregate
+        for sum, min, max and avg, which are also available here).
+
+        :return: int
+        """
+        return Sql.Sql.SELECTFROM(self.table_name).count()
+
+    def exists(self, **conditions):
+        """
+        :param conditions: conditions like in find
+        :return: True if a row matching conditions exists
+        """
+        e=Sql.Sql.SELECTFROM(self.table_name)
+        if len(conditions) != 0:
+            e=e.WHERE(**conditions)
+        return e.exists()
+
     def find(self, **conditions):
         """
         similar to sqlalchemy's Sql.filter_by function
@@ -32,6 +94,15 @@ class Query(object):
         """
         return Sql.Sql.INSERT(**values).INTO(self.table_name).do(raw=False)
 
+    async def new_async(self, **values):
+        """
+        Awaitable counterpart to new.
+
+        :param values: key value dict for obj
+        :return: new instance of table model
+        """
+        return await Sql.Sql.INSERT(**values).INTO(self.table_name).do_async(raw=False)
+
     def delete(self, **values):
         """
         deletes object from dateabase
@@ -1,7 +1,15 @@
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
 from dataclasses import dataclass
 
 import pymysql.cursors
 
+from . import Sql
 from . import bigsql
 from . import err
 from . import models
@@ -13,9 +21,15 @@ class ObjectTracker(object):
     It indexes based on table, and the object primary keys.
 
     This structure is basically a radix tree.
+
+    If weak is set, objects are only held by weak reference, so
+    clean objects are dropped from the tree once nothing else uses
+    them. Dirty objects are always held until they are marked clean.
     """
-    def __init__(self):
+    def __init__(self, weak=False):
+        self.weak=weak
         self.tree={}
+        self.dirty={}
 
     def __iter__(self):
         """
@@ -28,7 +42,7 @@ class ObjectTracker(object):
 
     def __contains__(self, o):
         table_key, object_key=self.make_key(o)
-        return table_key not in self.tree or object_key not in self.tree[table_key]
+        return table_key in self.tree and self.tree[table_key].get(object_key) is o
 
     def add(self, o):
         """
@@ -41,11 +55,20 @@ class ObjectTracker(object):
         :return:
         """
         table_key, object_key=self.make_key(o)
+        tracked=self.table(table_key)
+        tracked_o=tracked.get(object_key)
+        if tracked_o is None:
+            tracked[object_key]=tracked_o=o
+        return tracked_o
+
+    def table(self, table_key):
+        """
+        :param table_key: name of table
+        :return: dict of primary key values to tracked objects for table
+        """
         if table_key not in self.tree:
-            self.tree[table_key]=dict()
-        if object_key not in self.tree[table_key]:
-            self.tree[table_key][object_key]=o
-        return self.tree[table_key][object_key]
+            self.tree[table_key]=weakref.WeakValueDictionary() if self.weak else dict()
+        return self.tree[table_key]
 
     def delete(self, o):
         """
@@ -53,10 +76,29 @@ class ObjectTracker(object):
         the delete sql statement needs to be executed.
         """
         table_key, object_key=self.make_key(o)
-        if table_key not in self.tree:
-            self.tree[table_key]=dict()
-        if object_key not in self.tree[table_key]:
+        if o in self:
             del self.tree[table_key][object_key]
+        self.mark_clean(o)
+
+    def mark_dirty(self, o):
+        """
+        Records o as having modifications that have not yet
+        been written to the database. Objects are indexed by
+        identity, as their hash changes along with their state.
+
+        :param o:
+        :return:
+        """
+        self.dirty[id(o)]=o
+
+    def mark_clean(self, o):
+        """
+        Removes o from the dirty set once its changes have been written.
+
+        :param o:
+        :return:
+        """
+        self.dirty.pop(id(o), None)
 
     def clear(self):
         """
@@ -68,6 +110,7 @@ class ObjectTracker(object):
         for table_name in self.tree.keys():
             self.tree[table_name].clear()
         self.tree.clear()
+        self.dirty.clear()
 
     @staticmethod
     def make_key(o):
@@ -79,22 +122,35 @@ class ObjectTracker(object):
         :param o:
         :return:
         """
-        table_key=o.__table__.name
-        object_key=tuple(
-            getattr(o, col.column_name)
-            for col in o.__primary_keys__
-        )
-        return table_key, object_key
+        return o.__table__.name, o.__primary_key_values__
+
+
+class Result(tuple):
+    """
+    Rows handed back from an execution. This behaves exactly like
+    the tuple from cursor.fetchall(), but also carries the cursor
+    metadata for the statement that produced it.
+
+    lastrowid : id generated by the statement (first id for multi-row inserts)
+    rowcount  : number of rows affected by the statement
+    """
+    lastrowid=None
+    rowcount=-1
 
 
 class Connection(object):
     """
     Simple wrapper for pymysql connections
+
+    created_at : time the connection was opened
+    last_used  : time the connection was last handed back to its pool
     """
 
     def __init__(self, name):
         self.name=name
         self.conn=None
+        self.created_at=None
+        self.last_used=None
         self.connect()
 
     def connect(self):
@@ -113,6 +169,7 @@ class Connection(object):
             cursorclass=pymysql.cursors.Cursor,
             autocommit=False
         )
+        self.created_at=self.last_used=time.monotonic()
 
     def reconnect(self):
         """
@@ -128,9 +185,32 @@ class Connection(object):
         Closes connection object.
         :return:
         """
-        self.conn.close()
+        if self.conn is not None and self.conn.open:
+            self.conn.close()
         self.conn=None
 
+    def validate(self):
+        """
+        Checks that the connection is still alive by pinging the server.
+
+        :return: bool
+        """
+        if self.conn is None or not self.conn.open:
+            return False
+        try:
+            self.conn.ping(reconnect=False)
+        except pymysql.err.Error:
+            return False
+        return True
+
+    @property
+    def age(self):
+        return time.monotonic() - self.created_at
+
+    @property
+    def idle(self):
+        return time.monotonic() - self.last_used
+
     def commit_transaction(self):
         """
         commit transaction
@@ -159,15 +239,13 @@ class Connection(object):
         :param args:
         :return:
         """
-        try:
-            with self.conn.cursor() as cursor:
-                cursor.execute(sql, args)
-                res=cursor.fetchall()
-        finally:
-                cursor.close()
+        with self.conn.cursor() as cursor:
+            cursor.execute(sql, args)
+            res=Result(cursor.fetchall())
+            res.lastrowid=cursor.lastrowid
+            res.rowcount=cursor.rowcount
         return res
 
-
     def execute(self, sql, args=None):
         """
         Executes raw sql through the current self.cursor.
@@ -182,17 +260,260 @@ class Connection(object):
             msg='{} {}'.format(sql, args)
             bigsql.logging.info(msg)
 
-        if self.conn is None or not self.conn.open:
-            self.connect()
+        return self._execute(sql, args)
+
+
+    def stream(self, sql, args=None, batch_size=1000):
+        """
+        Executes sql with an unbuffered server side cursor, yielding
+        the rows in batches as they come in, so memory use does not
+        grow with the size of the result. The connection can not be
+        used for anything else until the generator is exhausted.
+
+        If the generator is closed early, the connection is closed
+        rather than reading the rest of the result off the wire.
 
+        :param str sql: raw sql statement
+        :param tuple args: tuple of arguments for sql statement
+        :param int batch_size: number of rows to fetch at a time
+        :return: generator of lists of rows
+        """
+        if bigsql.config['VERBOSE_SQL_EXECUTION']:
+            msg='{} {}'.format(sql, args)
+            bigsql.logging.info(msg)
+
+        cursor=self.conn.cursor(pymysql.cursors.SSCursor)
         try:
-            res=self._execute(sql, args)
-        except pymysql.err.InterfaceError or AttributeError:
-            print('Error in execution, attempting reconnect...')
-            self.reconnect()
-            res=self._execute(sql, args)
+            cursor.execute(sql, args)
+            while True:
+                rows=cursor.fetchmany(batch_size)
+                if len(rows) == 0:
+                    break
+                yield rows
+        except GeneratorExit:
+            self.close()
+            raise
+        finally:
+            if self.conn is not None:
+                cursor.close()
 
-        return res
+
+class ConnectionPool(object):
+    """
+    Thread safe pool of Connection objects. Connections are opened
+    lazily up to max_size, and handed out one at a time with checkout.
+    Idle connections past min_size are closed after idle_timeout seconds,
+    and any connection older than max_lifetime seconds is replaced.
+
+    Instead of retrying statements when a connection has gone away,
+    connections that have sat idle for more than validate_after seconds
+    are pinged when they are checked out, and thrown away if they are dead.
+    """
+    server_variables_sql='SELECT @@max_allowed_packet, @@auto_increment_increment, @@innodb_autoinc_lock_mode;'
+
+    class PoolError(Exception):
+        pass
+
+    def __init__(self, min_size=1, max_size=10, idle_timeout=300,
+                 max_lifetime=3600, validate_after=30, timeout=30):
+        self.min_size=min_size
+        self.max_size=max_size
+        self.idle_timeout=idle_timeout
+        self.max_lifetime=max_lifetime
+        self.validate_after=validate_after
+        self.timeout=timeout
+
+        self._idle=deque()
+        self._size=0
+        self._opened=0
+        self._server_variables=None
+        self._lock=threading.Condition(threading.Lock())
+
+        for _ in range(min_size):
+            with self._lock:
+                self._size+=1
+            self.checkin(self._open())
+
+    def __len__(self):
+        """
+        Number of open connections (checked out or idle).
+        """
+        return self._size
+
+    @staticmethod
+    def from_config():
+        """
+        Creates a pool sized by the SQL_POOL_* options in bigsql.config.
+
+        :return: ConnectionPool
+        """
+        return ConnectionPool(
+            min_size=bigsql.config['SQL_POOL_MIN_SIZE'],
+            max_size=bigsql.config['SQL_POOL_MAX_SIZE'],
+            idle_timeout=bigsql.config['SQL_POOL_IDLE_TIMEOUT'],
+            max_lifetime=bigsql.config['SQL_POOL_MAX_LIFETIME'],
+            validate_after=bigsql.config['SQL_POOL_VALIDATE_AFTER'],
+            timeout=bigsql.config['SQL_POOL_TIMEOUT'],
+        )
+
+    def _open(self):
+        """
+        Opens a new connection. The caller needs to have reserved
+        space for it in self._size (while holding self._lock, in the
+        same block that saw there was room for it).
+        """
+        with self._lock:
+            self._opened+=1
+            name='pool-{}'.format(self._opened)
+        try:
+            return Connection(name)
+        except Exception:
+            self._discard(None)
+            raise
+
+    def _discard(self, conn):
+        """
+        Closes conn, and frees up its space in the pool.
+        """
+        if conn is not None:
+            conn.close()
+        with self._lock:
+            self._size-=1
+            self._lock.notify()
+
+    def _expired(self, conn):
+        return self.max_lifetime is not None and conn.age > self.max_lifetime
+
+    def _prune(self):
+        """
+        Closes connections past min_size that have been idle for
+        longer than idle_timeout. Must be called holding self._lock.
+
+        :return: list of connections to close
+        """
+        if self.idle_timeout is None:
+            return []
+        stale=[]
+        while len(self._idle) != 0 and self._size - len(stale) > self.min_size \
+                and self._idle[0].idle > self.idle_timeout:
+            stale.append(self._idle.popleft())
+        return stale
+
+    def checkout(self, timeout=None):
+        """
+        Hands out a connection from the pool, opening a new one if none
+        are idle and the pool is not full. If the pool is full, this will
+        wait up to timeout seconds for a connection to be checked in.
+
+        :param timeout: seconds to wait, defaults to self.timeout
+        :return: Connection
+        """
+        timeout=self.timeout if timeout is None else timeout
+        deadline=None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                stale=self._prune()
+                conn=None
+                while len(self._idle) == 0 and self._size - len(stale) >= self.max_size:
+                    remaining=None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise self.PoolError(
+                            'Timed out waiting for a connection ({} in use)'.format(self._size)
+                        )
+                    self._lock.wait(remaining)
+                if len(self._idle) != 0:
+                    conn=self._idle.pop()
+                else:
+                    self._size+=1
+
+            for stale_conn in stale:
+                self._discard(stale_conn)
+
+            if conn is None:
+                return self._open()
+
+            if self._expired(conn) or (
+                    self.validate_after is not None
+                    and conn.idle > self.validate_after
+                    and not conn.validate()):
+                self._discard(conn)
+                continue
+            return conn
+
+    def checkin(self, conn):
+        """
+        Hands a connection back to the pool. Connections that are closed
+        or past their max lifetime are thrown away instead.
+
+        :param conn: Connection from checkout
+        :return:
+        """
+        if conn.conn is None or not conn.conn.open or self._expired(conn):
+            self._discard(conn)
+            return
+        conn.last_used=time.monotonic()
+        with self._lock:
+            self._idle.append(conn)
+            self._lock.notify()
+
+    @contextmanager
+    def connection(self):
+        """
+        Checks out a connection for the duration of a with block.
+
+        with pool.connection() as conn:
+            conn.execute(sql, args)
+        """
+        conn=self.checkout()
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback_transaction()
+            except pymysql.err.Error:
+                conn.close()
+            raise
+        finally:
+            self.checkin(conn)
+
+    def close(self):
+        """
+        Closes all idle connections. Checked out connections
+        are closed when they are checked back in.
+        """
+        with self._lock:
+            idle=list(self._idle)
+            self._idle.clear()
+            self.min_size=0
+        for conn in idle:
+            self._discard(conn)
+
+    @property
+    def server_variables(self):
+        """
+        Server settings that affect how statements are batched.
+        They are only read once per pool.
+
+        :return: max_allowed_packet, auto_increment_increment, innodb_autoinc_lock_mode
+        """
+        if self._server_variables is None:
+            with self.connection() as conn:
+                self._server_variables=tuple(conn.execute(self.server_variables_sql)[0])
+                conn.commit_transaction()
+        return self._server_variables
+
+    @property
+    def max_allowed_packet(self):
+        return self.server_variables[0]
+
+    @property
+    def auto_increment_increment(self):
+        return self.server_variables[1]
+
+    @property
+    def autoinc_lock_mode(self):
+        return self.server_variables[2]
 
 
 class Session(object):
@@ -201,16 +522,44 @@ class Session(object):
     and execute sql as needed for operations. Most important
     operations should be add commit and rollback.
 
-    self.mod_conn : connection for handling object modification sql
-    self.add_conn : connection for handling the creation of new entries
-    self.raw_conn : connection for handing raw execution
+    self.pool     : pool that connections are checked out of
+    self.aio_pool : pool that async connections are checked out of
+    self.orm_conn : connection bound to the current transaction. It is
+                    checked out on first use, and checked back in on
+                    commit or rollback.
+
+    Every method that talks to the database has an awaitable *_async
+    counterpart, which runs on self.aio_pool instead of self.pool.
+
+    Raw execution checks out a connection for each statement, so raw
+    queries from different threads run in parallel.
     """
 
-    def __init__(self):
-        self.object_tracker=ObjectTracker()
+    def __init__(self, pool=None, aio_pool=None):
+        self.object_tracker=ObjectTracker(weak=bigsql.config['SQL_WEAK_IDENTITY_MAP'])
+
+        self.pool=pool if pool is not None else ConnectionPool.from_config()
+        self.aio_pool=aio_pool
+        self._orm_conn=None
+        self._aio_orm_conn=None
+        self._async_transactions=0
+        self._written_tables=set()
+        self._collections={}
+        self._deleted={}
 
-        self.orm_conn=Connection('mod')
-        self.raw_conn=Connection('raw')
+    @property
+    def orm_conn(self):
+        if self._orm_conn is None:
+            self._orm_conn=self.pool.checkout()
+        return self._orm_conn
+
+    def _release(self):
+        """
+        Hands the transaction connection back to the pool.
+        """
+        if self._orm_conn is not None:
+            self.pool.checkin(self._orm_conn)
+            self._orm_conn=None
 
     def execute_raw(self, sql, args=None):
         """
@@ -220,15 +569,114 @@ class Session(object):
         :param tuple args: iterable arguments
         :return:
         """
-        r=self.raw_conn.execute(sql, args)
-        self.raw_conn.commit_transaction()
+        with self.pool.connection() as conn:
+            r=conn.execute(sql, args)
+            conn.commit_transaction()
         return r
 
+    def stream_raw(self, sql, args=None, batch_size=1000):
+        """
+        Streaming counterpart to execute_raw. A connection is checked
+        out of the pool for as long as the rows are being iterated.
+
+        :param str sql: raw sql
+        :param tuple args: iterable arguments
+        :param int batch_size: number of rows to fetch at a time
+        :return: generator of lists of rows
+        """
+        with self.pool.connection() as conn:
+            yield from conn.stream(sql, args, batch_size)
+            conn.commit_transaction()
+
+    def execute(self, sql, args=None):
+        """
+        Executes sql in the current transaction. Pending writes are
+        flushed first, so the statement sees them (a SELECT with
+        raw=False does not give back rows deleted in the session).
+
+        :param str sql: raw sql
+        :param tuple args: iterable arguments
+        :return:
+        """
+        self.flush()
+        return self.orm_conn.execute(sql, args)
+
+    def wrote(self, table, raw=False):
+        """
+        Records a write to table. Cached query results that read from
+        table are dropped now, and again when the transaction is
+        commited (reads on other connections may have cached the
+        old rows in the mean time).
+
+        :param table: name of table
+        :param raw: whether the write was made (and commited) on the raw connection
+        :return:
+        """
+        Sql.Sql.__results__.invalidate(table)
+        self._drop_collections(table)
+        if not raw:
+            self._written_tables.add(table)
+
+    def cache_collection(self, parent, foreign_table, relationship):
+        """
+        Keeps a relationship collection on parent for the life of the
+        session, so iterating it again does not query. The collection is
+        dropped when foreign_table is written through the session, and
+        on commit or rollback.
+
+        :param parent: model the relationship is on
+        :param foreign_table: name of table the children are from
+        :param relationship: DynamicModel.Relationship
+        :return: relationship
+        """
+        if parent.__collections__ is None:
+            parent.__collections__={}
+        parent.__collections__[foreign_table]=relationship
+        if foreign_table not in self._collections:
+            self._collections[foreign_table]=weakref.WeakValueDictionary()
+        self._collections[foreign_table][id(parent)]=parent
+        return relationship
+
+    def _drop_collections(self, table=None):
+        """
+        Drops cached relationship collections with children from
+        table (or all of them if table is None).
+        """
+        tables=list(self._collections) if table is None else [table]
+        for foreign_table in tables:
+            parents=self._collections.pop(foreign_table, {})
+            for parent in list(parents.values()):
+                if parent.__collections__ is not None:
+                    parent.__collections__.pop(foreign_table, None)
+
+    def _invalidate_written(self):
+        for table in self._written_tables:
+            Sql.Sql.__results__.invalidate(table)
+        self._written_tables.clear()
+
+    def bulk_add(self, table, rows, models=True, raw=False):
+        """
+        Inserts many rows into table using batched multi-row INSERT
+        statements. Batches are sized to fit under the servers
+        max_allowed_packet.
+
+        :param table: name of table (or model class) to insert into
+        :param rows: iterable of dicts, all with the same columns
+        :param bool models: hand back tracked models if True, else the number of inserted rows
+        :param bool raw: run on the raw connection (commited right away) instead of the session transaction
+        :return: list of models, or row count
+        """
+        table_name=table if isinstance(table, str) else table.__name__
+        e=Sql.Sql.INSERT_MANY(*rows).INTO(table_name)
+        return e.all(raw) if models else e.rowcount(raw)
+
     def clear(self):
         """
         Clears all tracked objects from session
         """
         self.object_tracker.clear()
+        self._deleted.clear()
+        self._drop_collections()
 
     def add(self, o):
         """
@@ -250,10 +698,110 @@ class Session(object):
     def delete(self, o):
         """
         Removes object from object tracker (if is was being tracked)
-        then executes its __delete_sql__ property.
+        and queues it to be deleted. Queued deletes are written on the
+        next flush, grouped by table into DELETE ... WHERE pk IN (...)
+        statements. Without SQL_UNIT_OF_WORK, __delete_sql__ is executed
+        right away.
         """
+        if len(o.__primary_keys__) == 0:
+            raise err.big_ERROR(
+                'Unable to delete {} without a primary key'.format(o.__table__.name)
+            )
         self.object_tracker.delete(o)
-        self.orm_conn.execute(*o.__delete_sql__)
+        if not bigsql.config['SQL_UNIT_OF_WORK']:
+            self.orm_conn.execute(*o.__delete_sql__)
+            self.wrote(o.__table__.name)
+            return
+        self._deleted[id(o)]=o
+        self._drop_collections(o.__table__.name)
+
+    def mark_dirty(self, o):
+        """
+        Called by models when a column is modified in unit of work
+        mode. The object is tracked, and its changes are held back
+        until the next flush. Once SQL_AUTOFLUSH_LIMIT objects are dirty
+        they are flushed right away (except while an async transaction
+        is open, as that needs flush_async).
+
+        :param o: model object (dynamic or static)
+        :return:
+        """
+        self.object_tracker.add(o)
+        self.object_tracker.mark_dirty(o)
+
+        limit=bigsql.config['SQL_AUTOFLUSH_LIMIT']
+        if limit is not None and len(self.object_tracker.dirty) >= limit and not self.in_async_transaction:
+            self.flush()
+
+    @property
+    def in_async_transaction(self):
+        """
+        :return: whether an async transaction is open, either with transaction()
+                 or by an async write that has not been commited yet
+        """
+        return self._async_transactions != 0 or self._aio_orm_conn is not None
+
+    def expunge(self, *objects):
+        """
+        Stops tracking objects. They are dropped from the identity map,
+        and any changes that have not been flushed are no longer written
+        by flush or commit (or undone by rollback).
+
+        :param objects: model objects
+        :return:
+        """
+        for o in objects:
+            self.object_tracker.delete(o)
+            self._deleted.pop(id(o), None)
+
+    def flush(self):
+        """
+        Writes all pending modifications to the database, issuing
+        one UPDATE per dirty object containing only the columns that
+        changed, then the queued deletes. The transaction is left open,
+        so the writes are visible to the orm connection but not yet commited.
+        This also runs before every statement executed in the session.
+
+        :return:
+        """
+        max_packet=self.pool.max_allowed_packet if len(self._deleted) != 0 else None
+        for sql in self._flush_statements(max_packet):
+            self.orm_conn.execute(*sql)
+
+    def _flush_statements(self, max_packet=None):
+        """
+        Yields the sql for each pending write. Objects are only marked
+        clean (or taken off the delete queue) once the generator is
+        resumed, so anything that fails to execute stays pending.
+
+        :param max_packet: max_allowed_packet for the server, needed if there are queued deletes
+        :return: generator of sql, args
+        """
+        for o in list(self.object_tracker.dirty.values()):
+            if o.__dirty_columns__:
+                yield o.__flush_sql__
+                o.__dirty_columns__.clear()
+                self.wrote(o.__table__.name)
+            self.object_tracker.mark_clean(o)
+
+        # deletes are written in the order they were queued, so children
+        # can be deleted before their parents without ON DELETE CASCADE.
+        # only deletes from the same table queued one after another are grouped
+        deleted=[]
+        for o in self._deleted.values():
+            if len(deleted) == 0 or deleted[-1][0] != o.__table__.name:
+                deleted.append((o.__table__.name, []))
+            deleted[-1][1].append(o)
+        for table, objects in deleted:
+            yield from Sql.Sql._generate_delete_many(
+                table,
+                [col.column_name for col in objects[0].__primary_keys__],
+                list(dict.fromkeys(o.__primary_key_values__ for o in objects)),
+                max_packet,
+            )
+            for o in objects:
+                self._deleted.pop(id(o), None)
+            self.wrote(table)
 
     def commit(self):
         """
@@ -261,11 +809,279 @@ class Session(object):
 
         :return:
         """
-        self.orm_conn.commit_transaction()
+        self.flush()
+        if self._orm_conn is not None:
+            self._orm_conn.commit_transaction()
+            self._release()
+        self._invalidate_written()
+        for o in self.object_tracker:
+            o.__commit__()
         self.object_tracker.clear()
+        self._drop_collections()
 
     def rollback(self):
+        for o in self.object_tracker.dirty.values():
+            o.__rollback__()
         for o in self.object_tracker:
             o.__rollback__()
+        for o in self._deleted.values():
+            o.__rollback__()
+        self._deleted.clear()
         self.object_tracker.clear()
-        self.orm_conn.rollback_transaction()
+        self._drop_collections()
+        self._written_tables.clear()
+        if self._orm_conn is not None:
+            try:
+                self._orm_conn.rollback_transaction()
+            except pymysql.err.Error:
+                self._orm_conn.close()
+            self._release()
+
+    async def _aio_conn(self):
+        """
+        Async counterpart to orm_conn.
+        """
+        if self._aio_orm_conn is None:
+            self._aio_orm_conn=await self.aio_pool.checkout()
+        return self._aio_orm_conn
+
+    async def _release_async(self):
+        if self._aio_orm_conn is not None:
+            await self.aio_pool.checkin(self._aio_orm_conn)
+            self._aio_orm_conn=None
+
+    async def execute_raw_async(self, sql, args=None):
+        """
+        Async counterpart to execute_raw.
+
+        :param str sql: raw sql
+        :param tuple args: iterable arguments
+        :return:
+        """
+        return await self.aio_pool.execute(sql, args)
+
+    async def execute_async(self, sql, args=None):
+        """
+        Executes sql in the current async transaction, after
+        flushing pending writes (see execute).
+
+        :param str sql: raw sql
+        :param tuple args: iterable arguments
+        :return:
+        """
+        await self.flush_async()
+        conn=await self._aio_conn()
+        return await conn.execute(sql, args)
+
+    async def flush_async(self):
+        """
+        Async counterpart to flush.
+        """
+        max_packet=None
+        if len(self._deleted) != 0:
+            max_packet, _, _=await self.aio_pool.server_variables()
+        for sql in self._flush_statements(max_packet):
+            conn=await self._aio_conn()
+            await conn.execute(*sql)
+
+    async def commit_async(self):
+        """
+        Async counterpart to commit.
+        """
+        await self.flush_async()
+        if self._aio_orm_conn is not None:
+            await self._aio_orm_conn.commit_transaction()
+            await self._release_async()
+        self._invalidate_written()
+        for o in self.object_tracker:
+            o.__commit__()
+        self.object_tracker.clear()
+        self._drop_collections()
+
+    async def rollback_async(self):
+        """
+        Async counterpart to rollback.
+        """
+        for o in self.object_tracker.dirty.values():
+            o.__rollback__()
+        for o in self.object_tracker:
+            o.__rollback__()
+        for o in self._deleted.values():
+            o.__rollback__()
+        self._deleted.clear()
+        self.object_tracker.clear()
+        self._drop_collections()
+        self._written_tables.clear()
+        if self._aio_orm_conn is not None:
+            try:
+                await self._aio_orm_conn.rollback_transaction()
+            finally:
+                await self._release_async()
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Runs an async with block as a transaction. It is commited
+        if the block finishes, and rolled back if it raises.
+
+        async with db.session.transaction() as session:
+            photo = await db.query('Photo').new_async(photoOwner='admin')
+            photo.caption = 'caption'
+        """
+        self._async_transactions+=1
+        try:
+            yield self
+        except BaseException:
+            await self.rollback_async()
+            raise
+        else:
+            await self.commit_async()
+        finally:
+            self._async_transactions-=1
+
+
+class ScopedSession(object):
+    """
+    Hands out one Session per context. Contexts are tracked with contextvars,
+    so every thread gets its own object tracker and transaction. Sessions
+    are also tied to the asyncio task that created them: child tasks inherit
+    their parents context, but still get a session of their own the first
+    time they use one. All sessions share the same connection pools.
+
+    Sessions are created the first time they are used in a context, and
+    should be torn down with remove() once the context is done with it
+    (big_SQL.init_app does this at the end of every flask request).
+
+    Attribute access is forwarded to the session for the current
+    context, so this can be used anywhere a Session can:
+
+    db.session.add(o)
+    db.session.commit()
+
+    Raw statements (execute_raw, stream_raw...) and the pools do not
+    need a session, so they are used without creating one.
+    """
+
+    def __init__(self, session_factory, pool=None, aio_pool=None):
+        self.session_factory=session_factory
+        self._pool=pool
+        self._aio_pool=aio_pool
+        self._session=contextvars.ContextVar(
+            'bigsql_session_{}'.format(id(self)),
+            default=None
+        )
+
+    @staticmethod
+    def _owner():
+        """
+        :return: asyncio task that is running, or None outside of one
+        """
+        try:
+            return asyncio.current_task()
+        except RuntimeError:
+            return None
+
+    def _current(self):
+        """
+        :return: Session for the current context, or None if it has not made one
+        """
+        scoped=self._session.get()
+        if scoped is None or scoped[0] is not self._owner():
+            return None
+        return scoped[1]
+
+    def __call__(self):
+        """
+        :return: Session for the current context
+        """
+        session=self._current()
+        if session is None:
+            session=self.session_factory()
+            self._session.set((self._owner(), session))
+        return session
+
+    def __getattr__(self, item):
+        return getattr(self(), item)
+
+    @property
+    def pool(self):
+        return self._pool if self._pool is not None else self().pool
+
+    @property
+    def aio_pool(self):
+        return self._aio_pool if self._aio_pool is not None else self().aio_pool
+
+    def execute_raw(self, sql, args=None):
+        """
+        See Session.execute_raw.
+        """
+        with self.pool.connection() as conn:
+            r=conn.execute(sql, args)
+            conn.commit_transaction()
+        return r
+
+    async def execute_raw_async(self, sql, args=None):
+        """
+        See Session.execute_raw_async.
+        """
+        return await self.aio_pool.execute(sql, args)
+
+    def stream_raw(self, sql, args=None, batch_size=1000):
+        """
+        See Session.stream_raw.
+        """
+        with self.pool.connection() as conn:
+            yield from conn.stream(sql, args, batch_size)
+            conn.commit_transaction()
+
+    def wrote(self, table, raw=False):
+        """
+        See Session.wrote. Without a session in the current context,
+        only the cached results need to be dropped.
+        """
+        session=self._current()
+        if session is not None:
+            session.wrote(table, raw)
+        else:
+            Sql.Sql.__results__.invalidate(table)
+
+    @property
+    def active(self):
+        """
+        :return: whether a session has been created in the current context
+        """
+        return self._current() is not None
+
+    def remove(self):
+        """
+        Tears down the session for the current context. Anything that
+        has not been commited is rolled back, and the transaction
+        connection is handed back to the pool.
+        """
+        session=self._current()
+        if session is not None:
+            try:
+                session.rollback()
+            finally:
+                self._session.set(None)
+
+    @contextmanager
+    def scope(self):
+        """
+        Runs a with block in a fresh session, which is commited if the
+        block finishes, or rolled back if it raises. The session that
+        was active before the block is restored afterwards.
+
+        with db.session.scope() as session:
+            session.add(o)
+        """
+        session=self.session_factory()
+        token=self._session.set((self._owner(), session))
+        try:
+            yield session
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+        finally:
+            self._session.reset(token)
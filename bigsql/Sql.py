@@ -1,18 +1,24 @@
+import json
 import string
+from collections import namedtuple
+from copy import copy
 from dataclasses import dataclass
 
 from scanf import scanf
 
 from . import bigsql
+from . import columnar
 from . import models
 from . import types
+from .cache import Cache
 
 
 class Table:
-    column_info_sql='SELECT COLUMN_NAME, DATA_TYPE, COLUMN_KEY ' \
+    column_info_sql='SELECT COLUMN_NAME, DATA_TYPE, COLUMN_KEY, COLUMN_DEFAULT, IS_NULLABLE, EXTRA ' \
                     'FROM INFORMATION_SCHEMA.COLUMNS ' \
                     'WHERE TABLE_NAME=%s ' \
-                    'AND TABLE_SCHEMA=DATABASE();'
+                    'AND TABLE_SCHEMA=DATABASE() ' \
+                    'ORDER BY ORDINAL_POSITION;'
     relationship_info_sql='SELECT TABLE_NAME ' \
                           'FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE ' \
                           'WHERE REFERENCED_TABLE_NAME=%s;'
@@ -20,18 +26,75 @@ class Table:
     def __init__(self, name):
         self.name=name
 
-        if name not in Sql.__cache__['tables']:
+        cached=Sql.__cache__['tables'].get(name)
+        if cached is Cache.MISSING and Sql.__schema__ is not None and Sql.__schema__.covers(name):
+            cached=Sql.__schema__.table(name)
+        if cached is Cache.MISSING:
             self.columns=self._get_columns()
             self.primary_keys=tuple(filter(
                 lambda column: column.primary_key,
                 self.columns
             ))
             self.relationships=self._get_relationships()
-            Sql.__cache__['tables'][name]=self
+            self.column_names=frozenset(col.column_name for col in self.columns)
+            self._cache()
+            self._refresh_models()
         else:
-            self.columns=Sql.__cache__['tables'][name].columns
-            self.primary_keys=Sql.__cache__['tables'][name].primary_keys
-            self.relationships=Sql.__cache__['tables'][name].relationships
+            self.columns=cached.columns
+            self.primary_keys=cached.primary_keys
+            self.relationships=cached.relationships
+            self.column_names=cached.column_names
+
+    def _refresh_models(self):
+        """
+        Model classes are bound to the columns of the table as they were
+        when the class was first used. If the table has been reflected
+        again (once its metadata expired) and its columns changed, the
+        classes are unbound, so they are bound to the new columns.
+        """
+        column_names=tuple(col.column_name for col in self.columns)
+        for model in (models.ModelMeta.__registry__.get(self.name), models.TempModel.__generated__.get(self.name)):
+            if model is not None and '__column_index__' in model.__dict__ \
+                    and model.__column_names__ != column_names:
+                model.__unbind__()
+
+    def _cache(self):
+        """
+        Adds table to the metadata cache. It is tagged with the tables
+        that reference it as well, as their foreign keys are part of
+        its relationships.
+        """
+        Sql.__cache__['tables'].set(
+            self.name,
+            self,
+            tags=[self.name] + list(self.relationships)
+        )
+
+    @staticmethod
+    def from_metadata(name, column_rows, relationships):
+        """
+        Builds a Table out of already reflected metadata (see Schema),
+        without querying INFORMATION_SCHEMA.
+
+        :param name: name of table
+        :param column_rows: rows in the same shape as Table.column_info_sql
+        :param relationships: names of tables that reference this one
+        :return: Table
+        """
+        table=Table.__new__(Table)
+        table.name=name
+        table.columns=[
+            types.DynamicColumn(name, *r)
+            for r in column_rows
+        ]
+        table.primary_keys=tuple(filter(
+            lambda column: column.primary_key,
+            table.columns
+        ))
+        table.relationships=list(relationships)
+        table.column_names=frozenset(col.column_name for col in table.columns)
+        table._cache()
+        return table
 
     def _get_columns(self):
         """
@@ -73,7 +136,7 @@ class JoinedTable(Table):
     The sql generation is lazy
     """
 
-    __cached_attrs__=dict()
+    __cached_attrs__=Cache(tags=lambda attrid: attrid.split('.'))
 
     @dataclass
     class _JoinAttribute:
@@ -95,27 +158,34 @@ class JoinedTable(Table):
     def __init__(self, current_table, ref_table):
         joinid='{}.{}'.format(current_table, ref_table)
         super(self.__class__, self).__init__(ref_table)
-        if joinid not in Sql.__cache__['joined_tables']:
-            self.current_table=current_table.name
+        self.current_table=current_table.name
+        cached=Sql.__cache__['joined_tables'].get(joinid)
+        if cached is Cache.MISSING:
             self.join_attr=None
             self.sql=None
             Sql.__cache__['joined_tables'][joinid]=self
         else:
-            self.join_attr=Sql.__cache__['joined_tables'][joinid].join_attr
-            self.sql=Sql.__cache__['joined_tables'][joinid].sql
+            self.join_attr=cached.join_attr
+            self.sql=cached.sql
 
 
     @staticmethod
     def resolve_attribute(current_table, foreign_table):
         attrid='{}.{}'.format(current_table, foreign_table)
-        if attrid in JoinedTable.__cached_attrs__:
-            return JoinedTable.__cached_attrs__[attrid]
+        cached=JoinedTable.__cached_attrs__.get(attrid)
+        if cached is not Cache.MISSING:
+            return cached
+        if Sql.__schema__ is not None and Sql.__schema__.covers(current_table, foreign_table):
+            attr=Sql.__schema__.join_attributes.get((current_table, foreign_table))
+            JoinedTable.__cached_attrs__[attrid]=attr
+            return attr
         raw=Sql.session.execute_raw(
             JoinedTable.ref_info_sql,
             (current_table, foreign_table,)
         )
-        JoinedTable.__cached_attrs__[attrid] = None if len(raw) == 0 else raw[0]
-        return JoinedTable.__cached_attrs__[attrid]
+        attr=None if len(raw) == 0 else tuple(raw[0])
+        JoinedTable.__cached_attrs__[attrid]=attr
+        return attr
 
     def _gen(self):
         """
@@ -149,6 +219,123 @@ class JoinedTable(Table):
         return self._gen()
 
 
+class Schema:
+    """
+    Metadata for every table in the database. This is reflected in
+    two queries (rather than two per table), or loaded from a snapshot
+    file written by Schema.dump, so workers can start without touching
+    INFORMATION_SCHEMA at all.
+
+    columns         : { table_name: [ column row ] }, rows shaped like Table.column_info_sql
+    foreign_keys    : [ (table, column, referenced_table, referenced_column) ]
+    relationships   : { table_name: [ names of tables that reference it ] }
+    join_attributes : { (table, referenced_table): (column, referenced_column) }
+
+    The schema outlives the metadata caches, so entries that expire
+    are rebuilt from it rather than from INFORMATION_SCHEMA.
+    """
+    columns_sql='SELECT TABLE_NAME, COLUMN_NAME, DATA_TYPE, COLUMN_KEY, COLUMN_DEFAULT, IS_NULLABLE, EXTRA ' \
+                'FROM INFORMATION_SCHEMA.COLUMNS ' \
+                'WHERE TABLE_SCHEMA=DATABASE() ' \
+                'ORDER BY TABLE_NAME, ORDINAL_POSITION;'
+    foreign_keys_sql='SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME ' \
+                     'FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE ' \
+                     'WHERE TABLE_SCHEMA=DATABASE() ' \
+                     'AND REFERENCED_TABLE_NAME IS NOT NULL;'
+
+    snapshot_version=1
+
+    def __init__(self, columns, foreign_keys):
+        self.columns=columns
+        self.foreign_keys=[tuple(fk) for fk in foreign_keys]
+        self.relationships={}
+        self.join_attributes={}
+        for table, column, ref_table, ref_column in self.foreign_keys:
+            self.relationships.setdefault(ref_table, []).append(table)
+            self.join_attributes.setdefault((table, ref_table), (column, ref_column))
+
+    @staticmethod
+    def reflect():
+        """
+        Reads the metadata for the whole database.
+
+        :return: Schema
+        """
+        columns={}
+        for row in Sql.session.execute_raw(Schema.columns_sql):
+            columns.setdefault(row[0], []).append(list(row[1:]))
+        return Schema(
+            columns,
+            Sql.session.execute_raw(Schema.foreign_keys_sql)
+        )
+
+    @staticmethod
+    def load(path):
+        """
+        Reads a snapshot written by Schema.dump.
+
+        :param path: path to snapshot file
+        :return: Schema
+        """
+        with open(path) as f:
+            snapshot=json.load(f)
+        if snapshot.get('version') != Schema.snapshot_version:
+            raise Sql.ExpressionError(
+                'Unsupported schema snapshot {}'.format(path)
+            )
+        return Schema(snapshot['columns'], snapshot['foreign_keys'])
+
+    def dump(self, path):
+        """
+        Writes the schema to a json snapshot at path.
+
+        :param path: path to snapshot file
+        :return:
+        """
+        with open(path, 'w') as f:
+            json.dump({
+                'version': self.snapshot_version,
+                'columns': self.columns,
+                'foreign_keys': self.foreign_keys,
+            }, f, default=str)
+
+    def covers(self, *table_names):
+        """
+        :return: whether all of table_names were in the database when the schema was read
+        """
+        return all(name in self.columns for name in table_names)
+
+    def table(self, name):
+        """
+        Builds the Table for name out of the schema, and caches it.
+
+        :param name: name of table
+        :return: Table
+        """
+        return Table.from_metadata(
+            name,
+            self.columns[name],
+            self.relationships.get(name, [])
+        )
+
+    def install(self):
+        """
+        Fills the table and foreign key caches from this schema.
+
+        :return:
+        """
+        for (table, ref_table), attr in self.join_attributes.items():
+            JoinedTable.__cached_attrs__['{}.{}'.format(table, ref_table)]=attr
+
+        for name in self.columns:
+            self.table(name)
+            model=models.ModelMeta.__registry__.get(name)
+            if model is not None:
+                model.__unbind__()
+                model.__bind__()
+        Sql.__schema__=self
+
+
 class Sql:
     """
     _type    : type of expression (select, insert, ...)
@@ -166,14 +353,36 @@ class Sql:
     _attrs: names of accessable attributes (foreign and local)
 
     bigsql.config['VERBOSE_SQL_GENERATION'] : bool
-    __cache__   : dict
+    __cache__   : dict of metadata caches (see cache.Cache)
     """
     __sep__=' '
+    __operators__={
+        'eq'     : '=',
+        'ne'     : '!=',
+        'gt'     : '>',
+        'ge'     : '>=',
+        'gte'    : '>=',
+        'lt'     : '<',
+        'le'     : '<=',
+        'lte'    : '<=',
+        'like'   : 'LIKE',
+        'notlike': 'NOT LIKE',
+        'in'     : 'IN',
+        'notin'  : 'NOT IN',
+        'between': 'BETWEEN',
+        'isnull' : 'IS NULL',
+    }
+
+    __aggregates__=('COUNT', 'SUM', 'MIN', 'MAX', 'AVG')
+    __row_types__={}
 
     __cache__={
-        'tables': {},
-        'joined_tables': {}
+        'tables': Cache(),
+        'joined_tables': Cache(tags=lambda joinid: joinid.split('.')),
     }
+    __results__=Cache()
+    __compiled__=Cache()
+    __schema__=None
     session=None
 
     class ExpressionError(Exception):
@@ -181,12 +390,77 @@ class Sql:
         Generic Exception, nothing special.
         """
 
+    @staticmethod
+    def _metadata_caches():
+        return [
+            Sql.__cache__['tables'],
+            Sql.__cache__['joined_tables'],
+            JoinedTable.__cached_attrs__,
+            Sql.__compiled__,
+        ]
+
+    @staticmethod
+    def configure_cache(ttl, maxsize, result_ttl=None, result_maxsize=None):
+        """
+        Sets the ttl (seconds) and size bound for all the metadata
+        caches, and for the query result cache.
+        """
+        for cache in Sql._metadata_caches():
+            cache.configure(ttl, maxsize)
+        Sql.__results__.configure(result_ttl, result_maxsize)
+
+    @staticmethod
+    def invalidate(table):
+        """
+        Drops all cached metadata for table, so it will be reflected
+        again the next time it is used. Call this after altering a table.
+
+        :param table: name of table
+        """
+        for cache in Sql._metadata_caches():
+            cache.invalidate(table)
+        Sql.__results__.invalidate(table)
+        Sql.__schema__=None
+        models.TempModel.__generated__.pop(table, None)
+        model=models.ModelMeta.__registry__.get(table)
+        if model is not None:
+            model.__unbind__()
+
+    @staticmethod
+    def invalidate_all():
+        """
+        Drops all cached metadata.
+        """
+        for cache in Sql._metadata_caches():
+            cache.clear()
+        Sql.__results__.clear()
+        Sql.__schema__=None
+        models.TempModel.__generated__.clear()
+        for model in list(models.ModelMeta.__registry__.values()):
+            model.__unbind__()
+
+    @staticmethod
+    def cache_info():
+        """
+        :return: hits, misses and size for each metadata cache
+        """
+        return {
+            'tables': Sql.__cache__['tables'].info(),
+            'joined_tables': Sql.__cache__['joined_tables'].info(),
+            'foreign_keys': JoinedTable.__cached_attrs__.info(),
+            'results': Sql.__results__.info(),
+            'compiled': Sql.__compiled__.info(),
+        }
+
     @dataclass
     class _Condition:
         attribute: str
         attribute_table: str
         value: str
         operator: str=None
+        comparison: str='='
+        opens: int=0
+        closes: int=0
 
         def __iter__(self):
             """
@@ -202,6 +476,14 @@ class Sql:
         table: str
         name: str
 
+    @dataclass(frozen=True)
+    class Param:
+        """
+        Placeholder for a value that is bound when a compiled
+        expression is executed (see Sql.param and Sql.compile).
+        """
+        name: str
+
     def __init__(self):
         """
         Only needs to null out all the state attributes.
@@ -219,10 +501,15 @@ class Sql:
         self._conditions=None
         self._group_by_column=None
         self._order_by_column=None
+        self._limit=None
+        self._offset=None
+        self._preload=None
 
         # INSERT
         self._insert_values=None
+        self._insert_rows=None
         self._on_dup_update=False
+        self._reread=False
 
         # UPDATE
         self._updates_values=None
@@ -275,13 +562,10 @@ class Sql:
             return self._table.name
         if self._joins is not None:
             for joined_table in self._joins:
-                for column in joined_table.columns:
-                    if column.column_name == attr_name:
-                        return joined_table.name
-        if not skip_curr:
-            for column in self._table.columns:
-                if column.column_name == attr_name:
-                    return self._table.name
+                if attr_name in joined_table.column_names:
+                    return joined_table.name
+        if not skip_curr and attr_name in self._table.column_names:
+            return self._table.name
         raise self.ExpressionError(
             'Unable to resolve column name {}'.format(attr_name)
         )
@@ -298,6 +582,13 @@ class Sql:
             <column>=<value>
             username=value
 
+        or with an operator (see Sql.__operators__):
+            <column>__<operator>=<value>
+            age__gt=18
+            username__in=['john', 'jane']
+            timestamp__between=(start, end)
+            caption__isnull=True
+
         :param clause: 'AND' or 'OR'
         :param specified_conditions: for when you want to be specific about conditions
         :param conditions: conditions that will be resolved
@@ -329,6 +620,15 @@ class Sql:
             )
 
         for attribute, value in conditions.items():
+            attribute, comparison=self._split_operator(attribute)
+            if comparison in ('IN', 'NOT IN') and isinstance(value, (str, bytes)):
+                raise self.ExpressionError(
+                    'Values for {} need to be a list'.format(comparison)
+                )
+            if comparison == 'BETWEEN' and (isinstance(value, Sql.Param) or len(value) != 2):
+                raise self.ExpressionError(
+                    'Values for BETWEEN need to be a pair'
+                )
             attribute_table=self._resolve_attribute(attribute)
             self._conditions.append(
                 self._Condition(
@@ -336,9 +636,57 @@ class Sql:
                     attribute=attribute,
                     attribute_table=attribute_table,
                     value=value,
+                    comparison=comparison,
                 )
             )
 
+    @staticmethod
+    def _split_operator(attribute):
+        """
+        Splits a condition keyword like age__gt into the
+        column name and the sql comparison.
+
+        :return: column name, comparison
+        """
+        column, _, suffix=attribute.rpartition('__')
+        if len(column) != 0 and suffix in Sql.__operators__:
+            return column, Sql.__operators__[suffix]
+        return attribute, '='
+
+    def _group_conditions(self, start, joiner):
+        """
+        Puts the conditions added since start in parentheses,
+        joined to each other by joiner.
+        """
+        group=self._conditions[start:]
+        if len(group) < 2:
+            return
+        for condition in group[1:]:
+            condition.operator=joiner
+        group[0].opens+=1
+        group[-1].closes+=1
+
+    @staticmethod
+    def _generate_condition(condition):
+        """
+        :return: sql_str, [args] for a single condition
+        """
+        column='`{}`.`{}`'.format(condition.attribute_table, condition.attribute)
+        comparison, value=condition.comparison, condition.value
+
+        if comparison == 'IS NULL':
+            return column + (' IS NULL' if value else ' IS NOT NULL'), []
+        if comparison in ('=', '!=') and value is None:
+            return column + (' IS NULL' if comparison == '=' else ' IS NOT NULL'), []
+        if comparison == 'BETWEEN':
+            return column + ' BETWEEN %s AND %s', list(value)
+        if comparison in ('IN', 'NOT IN') and not isinstance(value, Sql.Param):
+            values=list(value)
+            if len(values) == 0:
+                return 'FALSE' if comparison == 'IN' else 'TRUE', []
+            return '{} {} ({})'.format(column, comparison, ', '.join(['%s'] * len(values))), values
+        return '{} {} %s'.format(column, comparison), [value]
+
     def _generate_conditions(self):
         """
         This will hand back the sql as a string, and the
@@ -350,17 +698,23 @@ class Sql:
         ->
         "WHERE id=%i", (1,)
         """
-        return (Sql.__sep__ + Sql.__sep__.join(
-            '{operator} `{table}`.`{attr}` = %s'.format(
-                operator=operator,
-                table=table,
-                attr=attr,
-            )
-            for attr, table, value, operator in self._conditions
-        ), [
-                    value if type(value) != bool else int(value)
-                    for _, _, value, _ in self._conditions
-                ]) if self._conditions is not None else ('', [])
+        if self._conditions is None:
+            return '', []
+
+        sql, args=[], []
+        for condition in self._conditions:
+            condition_sql, condition_args=self._generate_condition(condition)
+            sql.append('{operator} {opens}{condition}{closes}'.format(
+                operator=condition.operator,
+                opens='(' * condition.opens,
+                condition=condition_sql,
+                closes=')' * condition.closes,
+            ))
+            args.extend(condition_args)
+        return Sql.__sep__ + Sql.__sep__.join(sql), [
+            value if type(value) != bool else int(value)
+            for value in args
+        ]
 
     def _generate_joins(self):
         """
@@ -390,10 +744,100 @@ class Sql:
             column_name=self._order_by_column,
         ) if self._order_by_column is not None else ''
 
-    def _generate_select(self):
+    def _generate_limit(self):
+        """
+        MySQL has no OFFSET without a LIMIT, so an OFFSET on its own
+        gets the largest possible LIMIT.
+
+        :return: sql_str, [args]
+        """
+        if self._limit is None and self._offset is None:
+            return '', []
+        sql=Sql.__sep__ + 'LIMIT %s'
+        args=[self._limit if self._limit is not None else 18446744073709551615]
+        if self._offset is not None:
+            sql+=' OFFSET %s'
+            args.append(self._offset)
+        return sql, args
+
+    def _generate_aggregate(self, function, column):
+        """
+        Generates a SELECT of function(column) over the rows the
+        expression selects. With a GROUP BY there is a row for each
+        group holding the group key and the value. Otherwise LIMIT and
+        OFFSET are applied to the rows before they are aggregated, and
+        without them ORDER BY is left out.
+
+        :param function: COUNT, SUM, MIN, MAX or AVG
+        :param column: name of column, or * for COUNT(*)
+        :return: sql_str, [args]
+        """
+        if self._type != 'SELECT' or self._table is None:
+            raise self.ExpressionError(
+                'Expression state incomplete'
+            )
+        if function not in Sql.__aggregates__:
+            raise self.ExpressionError(
+                'Unknown aggregate function {}'.format(function)
+            )
+        if column == '*' and function != 'COUNT':
+            raise self.ExpressionError(
+                '{}(*) is not valid, name the column to aggregate'.format(function)
+            )
+
+        if self._group_by_column is None and (self._limit is not None or self._offset is not None):
+            # only the aggregated column is selected in the derived table, as
+            # joined tables may share column names, which a derived table can't have
+            inner, args=self._generate_select(
+                '1' if column == '*' else '`{}`.`{}`'.format(self._resolve_attribute(column), column)
+            )
+            target='*' if column == '*' else '`_rows`.`{}`'.format(column)
+            return 'SELECT {function}({target}) FROM ({inner}) AS `_rows`'.format(
+                function=function,
+                target=target,
+                inner=inner,
+            ), args
+
+        target='*' if column == '*' else '`{}`.`{}`'.format(self._resolve_attribute(column), column)
+        columns='{}({})'.format(function, target)
+        if self._group_by_column is not None:
+            columns='`{}`.`{}`, {}'.format(
+                self._resolve_attribute(self._group_by_column),
+                self._group_by_column,
+                columns,
+            )
+
+        conditions, args=self._generate_conditions()
+        limit, limit_args=self._generate_limit()
+        base='SELECT {columns}' + Sql.__sep__ + 'FROM `{table}`{joins}{conditions}{groupby}{orderby}{limit}'
+        return base.format(
+            columns=columns,
+            table=self._table,
+            joins=self._generate_joins(),
+            conditions=conditions,
+            groupby=self._generate_groupby(),
+            # ungrouped there is only one row, and ORDER BY a column that
+            # is not aggregated is rejected under ONLY_FULL_GROUP_BY
+            orderby=self._generate_orderby() if self._group_by_column is not None else '',
+            limit=limit,
+        ), args + limit_args
+
+    def _generate_exists(self):
+        """
+        :return: sql_str, [args] for SELECT EXISTS(...) over the expression (without ORDER BY unless it has a LIMIT)
+        """
+        e=self
+        if self._limit is None and self._offset is None:
+            e=copy(self)
+            e._order_by_column=None
+        inner, args=e._generate_select()
+        return 'SELECT EXISTS({})'.format(inner), args
+
+    def _generate_select(self, columns=None):
         """
         Handle generation of sql for select expression.
 
+        :param columns: sql for the selected columns, in place of self._columns
         :return: sql_str, (args,)
         """
         if self._type != 'SELECT' or self._columns is None or self._table is None:
@@ -401,14 +845,15 @@ class Sql:
                 'Expression state incomplete'
             )
 
-        base='SELECT {columns}' + Sql.__sep__ + 'FROM {table}{joins}{conditions}{groupby}{orderby}'
+        base='SELECT {columns}' + Sql.__sep__ + 'FROM {table}{joins}{conditions}{groupby}{orderby}{limit}'
 
         table='`{table}`'.format(table=self._table)
-        columns=self._generate_select_columns()
+        columns=self._generate_select_columns() if columns is None else columns
         conditions, args=self._generate_conditions()
         joins=self._generate_joins()
         groupby=self._generate_groupby()
         orderby=self._generate_orderby()
+        limit, limit_args=self._generate_limit()
 
         return base.format(
             conditions=conditions,
@@ -417,7 +862,8 @@ class Sql:
             joins=joins,
             groupby=groupby,
             orderby=orderby,
-        ), args
+            limit=limit,
+        ), args + limit_args
 
     def _generate_insert(self):
         """
@@ -453,6 +899,83 @@ class Sql:
             for value in self._insert_values.values()
         )
 
+    def _generate_insert_many(self, rows):
+        """
+        Same as _generate_insert, but with one VALUES tuple per row
+        in rows. All rows need to have the same columns as
+        self._insert_values (the first row).
+
+        :param rows: list of dicts
+        :return: sql_str, [args]
+        """
+        if self._type != 'INSERT' or self._table is None or self._insert_values is None:
+            raise self.ExpressionError(
+                'Expression state incomplete'
+            )
+
+        columns=', '.join('`{column_name}`'.format(
+            column_name=column_name
+        ) for column_name in self._insert_values.keys())
+        row_values='({})'.format(', '.join(
+            ['%s'] * len(self._insert_values)
+        ))
+        ondup=self._generate_on_dup_update()
+
+        base='INSERT INTO `{table}`' + Sql.__sep__ + \
+             '({columns})' + Sql.__sep__ + \
+             'VALUES {values}' + Sql.__sep__ + \
+             '{ondup}'
+        insert_sql=base.format(
+            columns=columns,
+            values=', '.join([row_values] * len(rows)),
+            table=self._table,
+            ondup=ondup,
+        )
+
+        return insert_sql, [
+            value if type(value) != bool else int(value)
+            for row in rows
+            for value in (row[column_name] for column_name in self._insert_values)
+        ]
+
+    @staticmethod
+    def _estimate_size(value):
+        """
+        Upper bound on the number of bytes value will take up once
+        it has been escaped and interpolated into a statement.
+        """
+        if value is None or type(value) in (bool, int, float):
+            return len(str(value))
+        if isinstance(value, (bytes, bytearray)):
+            return 2 * len(value) + 10
+        if isinstance(value, str):
+            return 2 * len(value.encode('utf8')) + 2
+        return 2 * len(str(value)) + 2
+
+    def _batch_insert_rows(self, max_packet):
+        """
+        Splits self._insert_rows into batches that will each fit into
+        a single statement under max_packet bytes (and no more than
+        SQL_BULK_MAX_ROWS rows).
+
+        :param max_packet: max_allowed_packet for the server
+        :return: generator of lists of rows
+        """
+        overhead=len(self._generate_insert_many(self._insert_rows[:1])[0])
+        budget=max(max_packet - overhead - 1024, 1)
+        max_rows=bigsql.config['SQL_BULK_MAX_ROWS']
+
+        batch, batch_size=[], 0
+        for row in self._insert_rows:
+            row_size=sum(map(self._estimate_size, row.values())) + 2 * len(row) + 4
+            if len(batch) != 0 and (batch_size + row_size > budget or len(batch) >= max_rows):
+                yield batch
+                batch, batch_size=[], 0
+            batch.append(row)
+            batch_size+=row_size
+        if len(batch) != 0:
+            yield batch
+
     def _generate_on_dup_update(self):
         if not self._on_dup_update:
             return ''
@@ -498,24 +1021,29 @@ class Sql:
             conditions=conditions
         ), args1 + args2
 
-    def _generate_insert_select(self):
+    def _generate_insert_select(self, lastrowid=None):
         """
         after we run an insert, we would like to get that new row,
         and turn it into a model. Here we will need to determine if
         primary keys were inserted, or generated then create a select
         statement to get that new row out.
 
+        The generated id is passed in rather than read with LAST_INSERT_ID(),
+        as the select may not run on the connection that did the insert.
+
+        :param lastrowid: id generated by the insert
         :return: sql str
         """
 
         if all(pkey.column_name in self._insert_values for pkey in self._table.primary_keys):
-            sql, args=Sql.SELECTFROM(self._table.name).WHERE(**self._insert_values).gen()
+            sql, args=Sql.SELECTFROM(self._table.name).WHERE(**{
+                pkey.column_name: self._insert_values[pkey.column_name]
+                for pkey in self._table.primary_keys
+            }).gen()
         else:
-            sql, args=Sql.SELECTFROM(self._table.name).gen()
-            sql=sql[:-1]  # cut off
-            sql+=Sql.__sep__ + 'WHERE {}=LAST_INSERT_ID()'.format(
-                str(self._table.primary_keys[0])
-            )
+            sql, args=Sql.SELECTFROM(self._table.name).WHERE(**{
+                self._table.primary_keys[0].column_name: lastrowid
+            }).gen()
         if bigsql.config['VERBOSE_SQL_EXECUTION']:
             msg='{} {}'.format(sql, args)
             bigsql.logging.info(msg)
@@ -536,20 +1064,83 @@ class Sql:
             conditions=conditions
         ), args
 
+    @staticmethod
+    def _generate_delete_many(table, columns, keys, max_packet):
+        """
+        Generates DELETEs for the rows of table with the given primary
+        keys, in as few statements as max_packet and SQL_IN_CHUNK_SIZE
+        allow. Composite keys use row constructors:
+
+        DELETE FROM `T` WHERE (`T`.`a`, `T`.`b`) IN ((%s, %s), (%s, %s));
+
+        :return: generator of sql, args
+        """
+        return Sql._generate_keyed('DELETE FROM', table, columns, keys, max_packet)
+
+    @staticmethod
+    def _generate_select_many(table, columns, keys, max_packet):
+        """
+        SELECT counterpart to _generate_delete_many.
+
+        :return: generator of sql, args
+        """
+        return Sql._generate_keyed('SELECT * FROM', table, columns, keys, max_packet)
+
+    @staticmethod
+    def _generate_keyed(statement, table, columns, keys, max_packet):
+        """
+        :param statement: DELETE FROM or SELECT * FROM
+        :param table: name of table
+        :param columns: names of the primary key columns
+        :param keys: list of tuples of primary key values
+        :param max_packet: max_allowed_packet for the server
+        :return: generator of sql, args
+        """
+        column_sql=', '.join(
+            '`{}`.`{}`'.format(table, column)
+            for column in columns
+        )
+        row_sql=', '.join(['%s'] * len(columns))
+        if len(columns) > 1:
+            column_sql='({})'.format(column_sql)
+            row_sql='({})'.format(row_sql)
+        base=statement + ' `{table}` WHERE {columns} IN ({rows});'
+
+        budget=max(max_packet - len(base) - len(column_sql) - 1024, 1)
+        max_rows=bigsql.config['SQL_IN_CHUNK_SIZE']
+
+        batches, batch, batch_size=[], [], 0
+        for key in keys:
+            key_size=sum(map(Sql._estimate_size, key)) + 2 * len(key) + 4
+            if len(batch) != 0 and (batch_size + key_size > budget or len(batch) >= max_rows):
+                batches.append(batch)
+                batch, batch_size=[], 0
+            batch.append(key)
+            batch_size+=key_size
+        if len(batch) != 0:
+            batches.append(batch)
+
+        for batch in batches:
+            yield base.format(
+                table=table,
+                columns=column_sql,
+                rows=', '.join([row_sql] * len(batch)),
+            ), [value for key in batch for value in key]
+
     @staticmethod
     def _resolve_model(table_name):
         """
         Resolve the name of the table as a
-        string to a DynamicModel (else None).
+        string to a DynamicModel (see models.ModelMeta).
+        Tables without a model get a generated TempModel subclass.
 
         :param table_name: name of table to be resolved
-        :return: subclass of DynamicModel or None
+        :return: bound subclass of DynamicModel
         """
-        sub_models=models.DynamicModel.__subclasses__()
-        for model in sub_models:
-            if model.__name__ == table_name:
-                return model
-        return models.TempModel
+        model=models.ModelMeta.__registry__.get(table_name)
+        if model is not None:
+            return model.__bind__()
+        return models.TempModel.__for_table__(table_name)
 
     @property
     def extra_raw(self):
@@ -581,7 +1172,8 @@ class Sql:
             raw_extra_sql, raw_extra_args=self.extra_raw
             sql, args={
                 'SELECT': self._generate_select,
-                'INSERT': self._generate_insert,
+                'INSERT': self._generate_insert if self._insert_rows is None else
+                    lambda: self._generate_insert_many(self._insert_rows),
                 'UPDATE': self._generate_update,
                 'DELETE': self._generate_delete,
             }[self._type]()
@@ -595,6 +1187,210 @@ class Sql:
                 bigsql.logging.info(msg)
         return self._sql
 
+    def reread(self):
+        """
+        By default, INSERT expressions build the new model from the
+        inserted values, lastrowid and known column defaults. Call this
+        to select the new row back out instead, so that server generated
+        values (like CURRENT_TIMESTAMP defaults) are filled in.
+
+        :return: self
+        """
+        if self._type != 'INSERT':
+            raise self.ExpressionError(
+                'Invalid Expression Type'
+            )
+        self._reread=True
+        return self
+
+    def preload(self, *relationships):
+        """
+        Loads the given relationships for every model in the result
+        of a SELECT. Instead of a query per model when the relationship
+        is iterated, the children for all of the models are selected
+        with WHERE fk IN (...), SQL_IN_CHUNK_SIZE keys at a time, and
+        attached to their parents.
+
+        people=Sql.SELECTFROM('Person').preload('photos').all()
+
+        :param relationships: names of relationships (like photos)
+        :return: self
+        """
+        if self._type != 'SELECT':
+            raise self.ExpressionError(
+                'Invalid Expression Type'
+            )
+        if self._preload is None:
+            self._preload=[]
+        self._preload.extend(relationships)
+        return self
+
+    def _preload_expressions(self, parents, relationship):
+        """
+        Builds the SELECTs for the children of parents.
+
+        :param parents: models from self._table
+        :param relationship: name of relationship
+        :return: foreign table name, list of Sql expressions
+        """
+        Model=type(parents[0])
+        foreign_table=Model.__relationship_table__(relationship)
+        if foreign_table is None:
+            raise self.ExpressionError(
+                'No relationship {} on {}'.format(relationship, Model.__name__)
+            )
+        ref, curr=JoinedTable.resolve_attribute(foreign_table, Model.__name__)
+
+        keys=list(dict.fromkeys(
+            getattr(parent, curr)
+            for parent in parents
+            if not isinstance(getattr(parent, curr), Model.EmptyValue)
+        ))
+        if len(keys) == 0:
+            return foreign_table, []
+        return foreign_table, [
+            Sql.SELECTFROM(foreign_table).WHERE(**{'{}__in'.format(ref): keys})
+        ]
+
+    @staticmethod
+    def _attach_preloaded(parents, foreign_table, children):
+        """
+        Hands each parent its children, so iterating the relationship
+        does not need to query. The collections are kept by the session
+        (see Session.cache_collection).
+
+        :param parents: models
+        :param foreign_table: name of table the children are from
+        :param children: models from foreign_table
+        """
+        Model=type(parents[0])
+        ref, curr=JoinedTable.resolve_attribute(foreign_table, Model.__name__)
+        grouped={}
+        for child in children:
+            grouped.setdefault(getattr(child, ref), []).append(child)
+        for parent in parents:
+            Sql.session.cache_collection(parent, foreign_table, models.DynamicModel.Relationship(
+                parent,
+                foreign_table,
+                grouped.get(getattr(parent, curr), []),
+            ))
+
+    def _preload_relationships(self, parents, raw):
+        for relationship in self._preload or ():
+            if len(parents) == 0:
+                return
+            foreign_table, expressions=self._preload_expressions(parents, relationship)
+            children=[
+                child
+                for expression in expressions
+                for child in expression.all(raw)
+            ]
+            self._attach_preloaded(parents, foreign_table, children)
+
+    async def _preload_relationships_async(self, parents, raw):
+        for relationship in self._preload or ():
+            if len(parents) == 0:
+                return
+            foreign_table, expressions=self._preload_expressions(parents, relationship)
+            children=[]
+            for expression in expressions:
+                children.extend(await expression.all_async(raw))
+            self._attach_preloaded(parents, foreign_table, children)
+
+    @staticmethod
+    def param(name):
+        """
+        Named placeholder to use in place of a value in an expression
+        that will be compiled.
+
+        ex:
+
+        find_user=Sql.SELECTFROM('Person').WHERE(username=Sql.param('username')).compile()
+        find_user.first(username='admin')
+
+        :param name: name the value will be bound with
+        :return: Sql.Param
+        """
+        return Sql.Param(name)
+
+    @staticmethod
+    def _shape_value(value):
+        """
+        Hashable stand in for a value in Sql._shape
+        """
+        try:
+            hash(value)
+        except TypeError:
+            return type(value), repr(value)
+        return type(value), value
+
+    def _shape(self):
+        """
+        Hashable description of everything that goes into the generated
+        sql and args. Two expressions with the same shape generate the
+        same statement.
+
+        :return: tuple
+        """
+        return (
+            self._type,
+            str(self._table),
+            tuple(self._columns or ()),
+            tuple(joined_table.name for joined_table in self._joins or ()),
+            tuple(
+                (
+                    condition.operator,
+                    condition.attribute_table,
+                    condition.attribute,
+                    condition.comparison,
+                    condition.opens,
+                    condition.closes,
+                    self._shape_value(condition.value),
+                )
+                for condition in self._conditions or ()
+            ),
+            self._group_by_column,
+            self._order_by_column,
+            self._shape_value(self._limit),
+            self._shape_value(self._offset),
+            tuple(
+                (column, self._shape_value(value))
+                for column, value in (self._insert_values or {}).items()
+            ),
+            self._insert_rows is not None,
+            self._on_dup_update,
+            self._reread,
+            tuple(self._preload or ()),
+            tuple(
+                (column, self._shape_value(value))
+                for column, value in (self._updates_values or {}).items()
+            ),
+            tuple(
+                (sql, tuple(map(self._shape_value, args)))
+                for sql, args in self._raw_append_values or ()
+            ),
+        )
+
+    def compile(self):
+        """
+        Generates the sql for this expression once, so it can be executed
+        any number of times with different values for its Sql.param
+        placeholders. Compiled expressions are cached for the whole process
+        by shape, so compiling the same expression again is a lookup.
+
+        :return: CompiledSql
+        """
+        if self._insert_rows is not None:
+            raise self.ExpressionError(
+                'INSERT_MANY expressions can not be compiled'
+            )
+        key=self._shape()
+        compiled=Sql.__compiled__.get(key)
+        if compiled is Cache.MISSING:
+            compiled=CompiledSql(self)
+            Sql.__compiled__.set(key, compiled, tags=self._tables_read())
+        return compiled
+
     def append_raw(self, sql, args=None):
         """
         You can add any raw sql, along with its args here
@@ -612,33 +1408,186 @@ class Sql:
         ])
         return self
 
-    def _generate_models(self, *results):
+    def _generate_models(self, *results, track=True):
+        """
+        Turns rows selected from self._table into models, and adds
+        them to the session. Rows are handed to the model as they are,
+        with any joined columns past the end of self._table cut off.
+
+        When tracking, the primary key values are read straight out of
+        each row, and if the session already has that object it is
+        handed back without building a new model.
+
+        :param results: rows
+        :param track: add models to the session if True
+        :return: list of models
+        """
         Model=self._resolve_model(self._table.name)
-        model_init_kwargs=[
-            {
-                col.column_name: val
-                for col, val in zip(self._table.columns, item)
-            }
-            for item in results
+        width=len(Model.__column_names__)
+        primary_key_index=Model.__primary_key_index__
+        if not track or len(primary_key_index) == 0:
+            self._result=[
+                Model.__from_row__(row if len(row) == width else row[:width])
+                for row in results
+            ]
+            return self._result
+
+        tracked=Sql.session.object_tracker.table(self._table.name)
+        self._result=[]
+        for row in results:
+            key=tuple(row[index] for index in primary_key_index)
+            o=tracked.get(key)
+            if o is None:
+                o=tracked[key]=Model.__from_row__(row if len(row) == width else row[:width])
+            self._result.append(o)
+        return self._result
+
+    def _generated_primary_keys(self):
+        """
+        :return: names of primary keys that were not given values in the INSERT
+        """
+        return [
+            pkey.column_name
+            for pkey in self._table.primary_keys
+            if pkey.column_name not in self._insert_values
         ]
-        self._result=[
-            Sql.session.add(
-                Model(**kwargs)
+
+    def _needs_reread(self, lastrowid):
+        """
+        Inserted rows can be built client side from the inserted values,
+        column defaults and lastrowid. The row needs to be selected back
+        out if that was asked for, if the insert may have updated an
+        existing row, or if the primary keys cant be worked out.
+
+        :param lastrowid: id generated by the insert
+        :return: bool
+        """
+        if self._reread or self._on_dup_update or bigsql.config['SQL_INSERT_REREAD']:
+            return True
+        generated=self._generated_primary_keys()
+        return len(generated) > 1 or (len(generated) == 1 and not lastrowid)
+
+    def _generate_inserted_models(self, rows, lastrowid, increment=1):
+        """
+        Builds models for rows that were just inserted straight from
+        the inserted values. If the table has a single primary key
+        that was not inserted, it is assumed to be generated by the
+        server, starting at lastrowid. Columns that were not inserted
+        get their default value if it is known client side, and are
+        left empty otherwise (see Sql.reread).
+
+        :param rows: list of inserted dicts
+        :param lastrowid: first id generated by the insert
+        :param increment: @@auto_increment_increment for the server
+        :return: list of models
+        """
+        generated=self._generated_primary_keys()
+        if len(generated) > 1 or (len(generated) == 1 and not lastrowid):
+            raise self.ExpressionError(
+                'Unable to determine primary keys for inserted rows'
             )
-            for kwargs in model_init_kwargs
-        ] if Model is not models.TempModel else [
-            Sql.session.add(
-                Model(self._table.name, **kwargs)
+
+        defaults={
+            col.column_name: col.default
+            for col in self._table.columns
+            if col.column_name not in self._insert_values and col.default_known
+        }
+        model_init_kwargs=[dict(defaults, **row) for row in rows]
+        if len(generated) == 1:
+            for index, kwargs in enumerate(model_init_kwargs):
+                kwargs[generated[0]]=lastrowid + index * increment
+        return self._hydrate(model_init_kwargs)
+
+    def _hydrate(self, model_init_kwargs, track=True):
+        """
+        Turns a list of column value dicts into models for self._table,
+        and adds them to the session.
+
+        :param model_init_kwargs: list of dicts
+        :param track: add models to the session if True
+        :return: list of models
+        """
+        Model=self._resolve_model(self._table.name)
+        empty=[Model.__empty__] * len(Model.__column_names__)
+        rows=[]
+        for kwargs in model_init_kwargs:
+            row=list(empty)
+            for key, value in kwargs.items():
+                row[Model.__column_index__[key]]=value
+            rows.append(row)
+        return self._generate_models(*rows, track=track)
+
+    def iter(self, batch_size=1000, track=True, as_models=True):
+        """
+        Runs a SELECT expression on an unbuffered server side cursor,
+        yielding results as they are read, batch_size rows at a time.
+        Memory use stays flat no matter how big the result is.
+
+        for photo in Sql.SELECTFROM('Photo').iter(batch_size=5000, track=False):
+            ...
+
+        :param batch_size: number of rows to fetch at a time
+        :param track: add models to the session. Turn this off for big scans
+        :param as_models: yield models if True, else the raw rows. Relationships
+                          given to preload are loaded for each batch of models.
+                          SELECTs of named columns always yield rows
+        :return: generator of models (or rows)
+        """
+        if self._type != 'SELECT':
+            raise self.ExpressionError(
+                'Only SELECT expressions can be streamed'
             )
-            for kwargs in model_init_kwargs
-        ]
-        return self._result
+        as_models=as_models and not self._projected()
+        for rows in self._stream(batch_size):
+            if as_models:
+                result=self._generate_models(*rows, track=track)
+                self._preload_relationships(result, raw=True)
+                yield from result
+            else:
+                yield from rows
+
+    def _split_expressions(self):
+        """
+        :return: the expression split on its IN list (see _split_in), or just [self]
+        """
+        if self._in_condition() is None:
+            return [self]
+        return self._split_in(Sql.session.pool.max_allowed_packet)
+
+    async def _split_expressions_async(self):
+        """
+        Awaitable counterpart to _split_expressions.
+        """
+        if self._in_condition() is None:
+            return [self]
+        max_allowed_packet, _, _=await Sql.session.aio_pool.server_variables()
+        return self._split_in(max_allowed_packet)
+
+    def _stream(self, batch_size):
+        """
+        Streams the rows of a SELECT off a server side cursor, with one
+        statement for each part of a split IN list.
+
+        :return: generator of lists of rows
+        """
+        for e in self._split_expressions():
+            e.gen()
+            yield from Sql.session.stream_raw(*e._sql, batch_size=batch_size)
 
     def first(self, raw=True):
         """
+        SELECTs without a LIMIT get LIMIT 1, so only
+        one row is read.
+
         :return: first element of results
         """
-        res=self.all(raw)
+        expressions=self._split_expressions()
+        if len(expressions) > 1:
+            return next((
+                res for res in (e.first(raw) for e in expressions)
+                if res is not None
+            ), None)
+        res=self._limit_first().all(raw)
         return res[0] if res is not None and len(res) != 0 else None
 
     def all(self, raw=True):
@@ -656,24 +1605,797 @@ class Sql:
         *** If you select * out of a table, this will
         give you a list of initialized models. If the model
         has not been defined already, it will create a temporary
-        model for you.
+        model for you. SELECTs of named columns give back
+        the rows as tuples (see Sql.tuples).
+        """
+        if self._insert_rows is not None:
+            return self._insert_many(raw, hydrate=True)
+        if self._in_condition() is not None:
+            expressions=self._split_in(Sql.session.pool.max_allowed_packet)
+            if len(expressions) > 1:
+                results=[e.all(raw) for e in expressions]
+                self._result=None if self._type != 'SELECT' else [o for result in results for o in result]
+                return self._result
+
+        self.gen()
+
+        raw_result=self._fetch(raw)
+
+        if self._type == 'INSERT':
+            if not self._needs_reread(raw_result.lastrowid):
+                return self._generate_inserted_models(
+                    [self._insert_values],
+                    raw_result.lastrowid
+                )
+            sql=self._generate_insert_select(raw_result.lastrowid)
+            raw_result=self._executor(raw)(*sql)
+
+        if self._projected():
+            self._result=list(raw_result)
+            return self._result
+
+        if self._type in ('SELECT', 'INSERT'):
+            result=self._generate_models(*raw_result)
+            self._preload_relationships(result, raw)
+            return result
+
+    async def all_async(self, raw=True):
         """
+        Awaitable counterpart to all. The expression runs on the
+        sessions async connection pool.
+
+        :return: same as all
+        """
+        if self._insert_rows is not None:
+            return await self._insert_many_async(raw, hydrate=True)
+        if self._in_condition() is not None:
+            max_allowed_packet, _, _=await Sql.session.aio_pool.server_variables()
+            expressions=self._split_in(max_allowed_packet)
+            if len(expressions) > 1:
+                results=[await e.all_async(raw) for e in expressions]
+                self._result=None if self._type != 'SELECT' else [o for result in results for o in result]
+                return self._result
+
         self.gen()
 
-        raw_result={
-            True: Sql.session.execute_raw,
-            False: Sql.session.orm_conn.execute
-        }[raw](*self._sql)
+        raw_result=await self._fetch_async(raw)
+
+        if self._type == 'INSERT':
+            if not self._needs_reread(raw_result.lastrowid):
+                return self._generate_inserted_models(
+                    [self._insert_values],
+                    raw_result.lastrowid
+                )
+            sql=self._generate_insert_select(raw_result.lastrowid)
+            raw_result=await self._async_executor(raw)(*sql)
+
+        if self._projected():
+            self._result=list(raw_result)
+            return self._result
 
         if self._type in ('SELECT', 'INSERT'):
-            if self._type == 'INSERT':
-                sql=self._generate_insert_select()
-                raw_result={
-                    True: Sql.session.execute_raw,
-                    False: Sql.session.orm_conn.execute
-                }[raw](*sql)
+            result=self._generate_models(*raw_result)
+            await self._preload_relationships_async(result, raw)
+            return result
+
+    def _projected(self):
+        """
+        :return: True if the expression SELECTs named columns rather than *
+        """
+        return self._type == 'SELECT' and self._columns != ['*']
+
+    def _result_columns(self):
+        """
+        :return: names of the columns in each row the SELECT gives back
+        """
+        if self._projected():
+            return list(self._columns)
+        return [column.column_name for column in self._result_column_types()]
+
+    def _result_column_types(self):
+        """
+        :return: reflected column for each column in the rows the SELECT gives back
+        """
+        tables=[self._table] + (self._joins or [])
+        if not self._projected():
+            return [column for table in tables for column in table.columns]
+        columns={
+            (table.name, column.column_name): column
+            for table in tables
+            for column in table.columns
+        }
+        return [
+            columns[(self._resolve_attribute(column_name), column_name)]
+            for column_name in self._columns
+        ]
+
+    def _rows(self, raw):
+        """
+        Runs a SELECT, handing back the rows as the driver gave them.
+        Nothing is hydrated or added to the session.
+
+        :return: list of tuples
+        """
+        if self._type != 'SELECT':
+            raise self.ExpressionError(
+                'Only SELECT expressions give back rows'
+            )
+        if self._in_condition() is not None:
+            expressions=self._split_in(Sql.session.pool.max_allowed_packet)
+            if len(expressions) > 1:
+                return [row for e in expressions for row in e._rows(raw)]
+        self.gen()
+        return list(self._fetch(raw))
+
+    async def _rows_async(self, raw):
+        """
+        Awaitable counterpart to _rows.
+        """
+        if self._type != 'SELECT':
+            raise self.ExpressionError(
+                'Only SELECT expressions give back rows'
+            )
+        if self._in_condition() is not None:
+            max_allowed_packet, _, _=await Sql.session.aio_pool.server_variables()
+            expressions=self._split_in(max_allowed_packet)
+            if len(expressions) > 1:
+                return [row for e in expressions for row in await e._rows_async(raw)]
+        self.gen()
+        return list(await self._fetch_async(raw))
+
+    def _row_type(self):
+        """
+        :return: namedtuple class for the rows of the SELECT
+        """
+        fields=tuple(self._result_columns())
+        row_type=Sql.__row_types__.get(fields)
+        if row_type is None:
+            row_type=Sql.__row_types__[fields]=namedtuple('Row', fields, rename=True)
+        return row_type
+
+    def tuples(self, raw=True):
+        """
+        Runs a SELECT and hands back plain tuples instead of models. This
+        skips model construction and session tracking, which is a lot
+        cheaper for reads that only need a couple of columns.
+
+        Sql.SELECT('photoID', 'caption').FROM('Photo').tuples()
+        -> [(1, 'caption'), (2, None)]
+
+        :param raw: raw connection if True, else the session transaction
+        :return: list of tuples
+        """
+        return self._rows(raw)
+
+    def scalars(self, raw=True):
+        """
+        :return: list of the first column of each row
+        """
+        return [row[0] for row in self._rows(raw)]
+
+    def namedtuples(self, raw=True):
+        """
+        Same as tuples, but each row is a namedtuple with the column names as fields.
+
+        :return: list of namedtuples
+        """
+        row_type=self._row_type()
+        return [row_type._make(row) for row in self._rows(raw)]
+
+    def to_columns(self, batch_size=1000):
+        """
+        Streams a SELECT off a server side cursor into a buffer for
+        each column, without making an object for every row. Numeric
+        columns are read into typed arrays (see columnar.ColumnBuffer),
+        with a mask marking the NULLs.
+
+        columns=Sql.SELECT('photoID', 'timestamp').FROM('Photo').to_columns()
+        columns['photoID'].values -> array('q', [1, 2, 3])
+
+        :param batch_size: number of rows to fetch at a time
+        :return: dict of column name to columnar.ColumnBuffer
+        """
+        if self._type != 'SELECT':
+            raise self.ExpressionError(
+                'Only SELECT expressions can be exported'
+            )
+        return columnar.read_columns(
+            self._result_column_types(),
+            self._stream(batch_size)
+        )
+
+    def to_numpy(self, batch_size=1000):
+        """
+        Same as to_columns, but hands back a numpy array for each column.
+        Numeric columns with NULLs become masked arrays.
+
+        This needs the optional numpy dependency (pip install bigsql[numpy]).
+
+        :param batch_size: number of rows to fetch at a time
+        :return: dict of column name to numpy.ndarray
+        """
+        columnar.require_numpy()
+        return {
+            name: buffer.to_numpy()
+            for name, buffer in self.to_columns(batch_size).items()
+        }
+
+    async def tuples_async(self, raw=True):
+        return await self._rows_async(raw)
+
+    async def scalars_async(self, raw=True):
+        return [row[0] for row in await self._rows_async(raw)]
+
+    async def namedtuples_async(self, raw=True):
+        row_type=self._row_type()
+        return [row_type._make(row) for row in await self._rows_async(raw)]
+
+    def _tables_read(self):
+        """
+        :return: names of all tables a SELECT reads from
+        """
+        return [self._table.name] + [
+            joined_table.name
+            for joined_table in self._joins or []
+        ]
+
+    def _cacheable(self, raw):
+        """
+        Only SELECTs on the raw connection go through the result cache.
+        Reads in the session transaction may see uncommited writes.
+        """
+        return raw and self._type == 'SELECT' and bigsql.config['SQL_CACHE_ENABLED']
+
+    def _wrote(self, raw):
+        """
+        Lets the session know that this expression wrote to its table,
+        so cached results that read from it are dropped.
+        """
+        if self._type in ('INSERT', 'UPDATE', 'DELETE'):
+            Sql.session.wrote(self._table.name, raw)
+
+    def _fetch(self, raw):
+        """
+        Runs the generated sql. Raw SELECTs are served from the result
+        cache when SQL_CACHE_ENABLED is set, keyed on the sql and args.
+
+        :return: Session.Result
+        """
+        if not self._cacheable(raw):
+            result=self._executor(raw)(*self._sql)
+            self._wrote(raw)
+            return result
+
+        key=(self._sql[0], tuple(self._sql[1]))
+        result=Sql.__results__.get(key)
+        if result is Cache.MISSING:
+            result=Sql.session.execute_raw(*self._sql)
+            Sql.__results__.set(key, result, tags=self._tables_read())
+        return result
+
+    async def _fetch_async(self, raw):
+        """
+        Awaitable counterpart to _fetch.
+        """
+        if not self._cacheable(raw):
+            result=await self._async_executor(raw)(*self._sql)
+            self._wrote(raw)
+            return result
+
+        key=(self._sql[0], tuple(self._sql[1]))
+        result=Sql.__results__.get(key)
+        if result is Cache.MISSING:
+            result=await Sql.session.execute_raw_async(*self._sql)
+            Sql.__results__.set(key, result, tags=self._tables_read())
+        return result
+
+    @staticmethod
+    def _executor(raw):
+        """
+        :param raw: raw connection if True, else the session transaction
+        :return: function to execute sql with
+        """
+        return Sql.session.execute_raw if raw else Sql.session.execute
+
+    @staticmethod
+    def _async_executor(raw):
+        """
+        :param raw: raw connection if True, else the session transaction
+        :return: coroutine function to execute sql with
+        """
+        return Sql.session.execute_raw_async if raw else Sql.session.execute_async
+
+    def _insert_many(self, raw, hydrate):
+        """
+        Runs an INSERT_MANY expression in as few statements as
+        the servers max_allowed_packet will allow.
+
+        :param raw: run on raw connection if True, else the orm connection
+        :param hydrate: hand back models if True, else the number of inserted rows
+        :return: list of models, or row count
+        """
+        pool=Sql.session.pool
+        execute=self._executor(raw)
+        hydration=self._bulk_hydration(pool.autoinc_lock_mode) if hydrate else None
+        if hydration == 'single':
+            self._result=[o for row in self._insert_rows for o in self._single_insert(row).all(raw)]
+            return self._result
+
+        models_out, keys, rowcount=[], [], 0
+        for batch in self._batch_insert_rows(pool.max_allowed_packet):
+            result=execute(*self._generate_insert_many(batch))
+            rowcount+=result.rowcount
+            if hydration == 'values':
+                models_out.extend(self._generate_inserted_models(
+                    batch,
+                    result.lastrowid,
+                    pool.auto_increment_increment
+                ))
+            elif hydration == 'reread':
+                keys.extend(self._inserted_keys(batch, result.lastrowid, pool.auto_increment_increment))
+        self._wrote(raw)
+        if hydration == 'reread':
+            models_out=self._generate_reread_models(keys, [
+                row
+                for sql in self._generate_select_many(self._table.name, self._primary_key_names(), keys, pool.max_allowed_packet)
+                for row in execute(*sql)
+            ])
+        self._result=models_out if hydrate else rowcount
+        return self._result
+
+    async def _insert_many_async(self, raw, hydrate):
+        """
+        Awaitable counterpart to _insert_many.
+        """
+        max_allowed_packet, auto_increment_increment, lock_mode=await Sql.session.aio_pool.server_variables()
+        execute=self._async_executor(raw)
+        hydration=self._bulk_hydration(lock_mode) if hydrate else None
+        if hydration == 'single':
+            self._result=[]
+            for row in self._insert_rows:
+                self._result.extend(await self._single_insert(row).all_async(raw))
+            return self._result
+
+        models_out, keys, rowcount=[], [], 0
+        for batch in self._batch_insert_rows(max_allowed_packet):
+            result=await execute(*self._generate_insert_many(batch))
+            rowcount+=result.rowcount
+            if hydration == 'values':
+                models_out.extend(self._generate_inserted_models(
+                    batch,
+                    result.lastrowid,
+                    auto_increment_increment
+                ))
+            elif hydration == 'reread':
+                keys.extend(self._inserted_keys(batch, result.lastrowid, auto_increment_increment))
+        self._wrote(raw)
+        if hydration == 'reread':
+            rows=[]
+            for sql in self._generate_select_many(self._table.name, self._primary_key_names(), keys, max_allowed_packet):
+                rows.extend(await execute(*sql))
+            models_out=self._generate_reread_models(keys, rows)
+        self._result=models_out if hydrate else rowcount
+        return self._result
+
+    def _bulk_hydration(self, lock_mode):
+        """
+        Works out how models are built for the rows of an INSERT_MANY.
+
+        values : straight from the inserted values and generated ids
+        reread : selected back out by primary key after the inserts
+        single : one INSERT per row, so each generated id is known
+
+        Ids generated by a multi-row INSERT are only consecutive when
+        innodb_autoinc_lock_mode is 0 or 1. With 2 (the default since
+        MySQL 8) inserts running at the same time can take ids in between.
+        Rows updated by ON DUPLICATE KEY UPDATE get no new id at all.
+
+        :param lock_mode: @@innodb_autoinc_lock_mode for the server
+        :return: str
+        """
+        generated=self._generated_primary_keys()
+        if len(generated) > 1 or (len(generated) == 1 and self._on_dup_update):
+            raise self.ExpressionError(
+                'Unable to determine primary keys for inserted rows (use rowcount)'
+            )
+        if len(generated) == 1 and lock_mode not in (0, 1):
+            return 'single'
+        if self._reread or self._on_dup_update or bigsql.config['SQL_INSERT_REREAD']:
+            return 'reread'
+        return 'values'
+
+    def _single_insert(self, row):
+        """
+        :return: INSERT expression for one row of an INSERT_MANY
+        """
+        e=Sql.INSERT(**row).INTO(self._table.name)
+        e._reread=self._reread
+        return e
+
+    def _primary_key_names(self):
+        return [pkey.column_name for pkey in self._table.primary_keys]
+
+    def _inserted_keys(self, rows, lastrowid, increment=1):
+        """
+        :return: primary key values for each inserted row (see _generate_inserted_models)
+        """
+        return [
+            tuple(
+                row[pkey.column_name] if pkey.column_name in row else lastrowid + index * increment
+                for pkey in self._table.primary_keys
+            )
+            for index, row in enumerate(rows)
+        ]
+
+    def _generate_reread_models(self, keys, rows):
+        """
+        Builds models for rows selected back out after an INSERT_MANY,
+        in the order they were inserted.
+
+        :param keys: primary key values, in insert order
+        :param rows: selected rows
+        :return: list of models
+        """
+        order={key: index for index, key in enumerate(keys)}
+        names=[column.column_name for column in self._table.columns]
+        key_index=[names.index(name) for name in self._primary_key_names()]
+        rows=sorted(rows, key=lambda row: order.get(tuple(row[i] for i in key_index), len(order)))
+        return self._generate_models(*rows)
+
+    def rowcount(self, raw=True):
+        """
+        Runs the expression, handing back the number of rows that were
+        affected instead of models. Useful for INSERT_MANY, UPDATE and
+        DELETE expressions.
+
+        :return: int
+        """
+        if self._insert_rows is not None:
+            return self._insert_many(raw, hydrate=False)
+        if self._in_condition() is not None:
+            expressions=self._split_in(Sql.session.pool.max_allowed_packet)
+            if len(expressions) > 1:
+                return sum(e.rowcount(raw) for e in expressions)
+
+        self.gen()
+        return self._fetch(raw).rowcount
+
+    async def rowcount_async(self, raw=True):
+        """
+        Awaitable counterpart to rowcount.
+        """
+        if self._insert_rows is not None:
+            return await self._insert_many_async(raw, hydrate=False)
+        if self._in_condition() is not None:
+            max_allowed_packet, _, _=await Sql.session.aio_pool.server_variables()
+            expressions=self._split_in(max_allowed_packet)
+            if len(expressions) > 1:
+                rowcount=0
+                for e in expressions:
+                    rowcount+=await e.rowcount_async(raw)
+                return rowcount
+
+        self.gen()
+        return (await self._fetch_async(raw)).rowcount
+
+    def _in_condition(self, grouped=False):
+        """
+        Finds the longest IN list that the expression can be split on.
+        Expressions are only split if running them once per part of the
+        list gives the same rows, so not if they have a LIMIT, OFFSET,
+        GROUP BY, ORDER BY or any OR'd conditions.
+
+        :param grouped: allow a GROUP BY, for aggregates that are combined per group
+        :return: _Condition or None
+        """
+        if self._sql is not None or self._type not in ('SELECT', 'UPDATE', 'DELETE'):
+            return None
+        if any(attr is not None for attr in (
+            self._limit, self._offset, self._order_by_column,
+            None if grouped else self._group_by_column,
+        )):
+            return None
+        conditions=self._conditions or ()
+        if any(c.operator not in ('WHERE', 'AND') or c.opens != 0 for c in conditions):
+            return None
+        in_conditions=[
+            c for c in conditions
+            if c.comparison == 'IN' and isinstance(c.value, (list, tuple, set, frozenset))
+        ]
+        return max(in_conditions, key=lambda c: len(c.value), default=None)
+
+    def _split_in(self, max_packet, grouped=False):
+        """
+        Splits an expression with a long IN list into copies that each
+        have part of the list, no more than SQL_IN_CHUNK_SIZE values and
+        small enough to fit under max_packet bytes. Repeated values are
+        dropped first, so no row is selected by more than one part.
+
+        :param max_packet: max_allowed_packet for the server
+        :param grouped: see _in_condition
+        :return: list of expressions (just [self] if no split is needed)
+        """
+        condition=self._in_condition(grouped)
+        if condition is None:
+            return [self]
+
+        values=list(dict.fromkeys(condition.value))
+        # every part repeats the rest of the statement, other IN lists included
+        other_size=sum(
+            sum(self._estimate_size(value) + 2 for value in c.value)
+            if isinstance(c.value, (list, tuple, set, frozenset)) else self._estimate_size(c.value)
+            for c in self._conditions
+            if c is not condition
+        ) + sum(map(self._estimate_size, (self._updates_values or {}).values()))
+        budget=max(max_packet - other_size - 4096, 1)
+        max_values=bigsql.config['SQL_IN_CHUNK_SIZE']
+
+        chunks, chunk, chunk_size=[], [], 0
+        for value in values:
+            value_size=self._estimate_size(value) + 2
+            if len(chunk) != 0 and (chunk_size + value_size > budget or len(chunk) >= max_values):
+                chunks.append(chunk)
+                chunk, chunk_size=[], 0
+            chunk.append(value)
+            chunk_size+=value_size
+        chunks.append(chunk)
+        if len(chunks) == 1:
+            return [self]
+
+        expressions=[]
+        for chunk in chunks:
+            e=copy(self)
+            e._sql=None
+            e._result=None
+            e._conditions=[copy(c) if c is condition else c for c in self._conditions]
+            e._conditions[self._conditions.index(condition)].value=chunk
+            expressions.append(e)
+        return expressions
+
+    def _scalar_expression(self, sql):
+        """
+        :return: copy of the expression that runs sql in place of its own
+        """
+        e=copy(self)
+        e._sql=(sql[0] + ';', sql[1])
+        e._result=None
+        return e
+
+    @staticmethod
+    def _aggregate_result(rows, grouped):
+        if grouped:
+            return [tuple(row) for row in rows]
+        return rows[0][0] if len(rows) != 0 else None
+
+    def aggregate(self, function, column='*', raw=True):
+        """
+        Runs function(column) on the server over the rows the SELECT
+        expression would give back, without loading them. If the expression
+        has a GROUPBY, a list of (key, value) tuples is handed back, one
+        for each group.
+
+        Sql.SELECTFROM('Photo').WHERE(photoOwner='admin').aggregate('MAX', 'timestamp')
+        Sql.SELECTFROM('Photo').GROUPBY('photoOwner').aggregate('COUNT')
+        -> [('admin', 3), ('bob', 1)]
+
+        Expressions with a long IN list are run once for each part of the
+        list (see _split_in), and the results combined.
+
+        :param function: COUNT, SUM, MIN, MAX or AVG
+        :param column: name of column (* for COUNT)
+        :param raw: raw connection if True, else the session transaction
+        :return: value, or list of (key, value)
+        """
+        function=function.upper()
+        if self._in_condition(grouped=True) is None:
+            return self._aggregate(function, column, raw)
+        expressions=self._split_in(Sql.session.pool.max_allowed_packet, grouped=True)
+        if function == 'AVG':
+            return self._combine_avg(
+                [e._aggregate('SUM', column, raw) for e in expressions],
+                [e._aggregate('COUNT', column, raw) for e in expressions],
+            )
+        return self._combine_aggregate(function, [e._aggregate(function, column, raw) for e in expressions])
+
+    async def aggregate_async(self, function, column='*', raw=True):
+        """
+        Awaitable counterpart to aggregate.
+        """
+        function=function.upper()
+        if self._in_condition(grouped=True) is None:
+            return await self._aggregate_async(function, column, raw)
+        max_allowed_packet, _, _=await Sql.session.aio_pool.server_variables()
+        expressions=self._split_in(max_allowed_packet, grouped=True)
+        if function == 'AVG':
+            sums, counts=[], []
+            for e in expressions:
+                sums.append(await e._aggregate_async('SUM', column, raw))
+                counts.append(await e._aggregate_async('COUNT', column, raw))
+            return self._combine_avg(sums, counts)
+        results=[]
+        for e in expressions:
+            results.append(await e._aggregate_async(function, column, raw))
+        return self._combine_aggregate(function, results)
+
+    def _aggregate(self, function, column, raw):
+        e=self._scalar_expression(self._generate_aggregate(function, column))
+        return self._aggregate_result(e._fetch(raw), self._group_by_column is not None)
+
+    async def _aggregate_async(self, function, column, raw):
+        e=self._scalar_expression(self._generate_aggregate(function, column))
+        return self._aggregate_result(await e._fetch_async(raw), self._group_by_column is not None)
+
+    def _combine_aggregate(self, function, results):
+        """
+        Combines the results of an aggregate run over each part of a
+        split IN list. Grouped results are combined key by key.
+
+        :param function: COUNT, SUM, MIN or MAX
+        :param results: result of each part
+        :return: value, or list of (key, value)
+        """
+        if self._group_by_column is None:
+            return self._combine_values(function, results)
+        groups={}
+        for result in results:
+            for key, value in result:
+                groups.setdefault(key, []).append(value)
+        return [
+            (key, self._combine_values(function, values))
+            for key, values in groups.items()
+        ]
+
+    @staticmethod
+    def _combine_values(function, values):
+        values=[value for value in values if value is not None]
+        if function == 'COUNT':
+            return sum(values)
+        if len(values) == 0:
+            return None
+        return {'SUM': sum, 'MIN': min, 'MAX': max}[function](values)
+
+    def _combine_avg(self, sums, counts):
+        """
+        AVG can not be combined from the averages of each part,
+        so it is worked out from their SUMs and COUNTs.
+        """
+        total, count=self._combine_aggregate('SUM', sums), self._combine_aggregate('COUNT', counts)
+        if self._group_by_column is None:
+            return None if total is None or count == 0 else total / count
+        count=dict(count)
+        return [
+            (key, None if value is None or count.get(key, 0) == 0 else value / count[key])
+            for key, value in total
+        ]
+
+    def count(self, column='*', raw=True):
+        """
+        :return: number of rows the SELECT selects (non null values of column if given)
+        """
+        return self.aggregate('COUNT', column, raw)
+
+    async def count_async(self, column='*', raw=True):
+        """
+        Awaitable counterpart to count.
+        """
+        return await self.aggregate_async('COUNT', column, raw)
+
+    def sum(self, column, raw=True):
+        return self.aggregate('SUM', column, raw)
+
+    def min(self, column, raw=True):
+        return self.aggregate('MIN', column, raw)
+
+    def max(self, column, raw=True):
+        return self.aggregate('MAX', column, raw)
+
+    def avg(self, column, raw=True):
+        return self.aggregate('AVG', column, raw)
+
+    def exists(self, raw=True):
+        """
+        :return: True if the SELECT selects any rows
+        """
+        for expression in self._split_expressions():
+            e=expression._scalar_expression(expression._generate_exists())
+            if self._aggregate_result(e._fetch(raw), False):
+                return True
+        return False
+
+    async def exists_async(self, raw=True):
+        """
+        Awaitable counterpart to exists.
+        """
+        for expression in await self._split_expressions_async():
+            e=expression._scalar_expression(expression._generate_exists())
+            if self._aggregate_result(await e._fetch_async(raw), False):
+                return True
+        return False
+
+    def _limit_first(self):
+        """
+        :return: copy of a SELECT with LIMIT 1 if it has no LIMIT of its own, else self
+        """
+        if self._type != 'SELECT' or self._limit is not None or self._sql is not None:
+            return self
+        e=copy(self)
+        e._limit=1
+        e._result=None
+        return e
+
+    def paginate(self, by=None, page_size=1000, raw=True):
+        """
+        Iterates over the result of a SELECT a page at a time, in order of
+        the column by. Rather than an OFFSET that grows with every page,
+        each page picks up after the last value of by on the page before
+        (WHERE by > last ORDER BY by LIMIT page_size), so every page costs
+        about the same as the first. by needs to be unique, and defaults to
+        the primary key of the table. SELECTs of named columns need to
+        select by as well, and their pages are lists of tuples.
+
+        for photos in Sql.SELECTFROM('Photo').paginate(page_size=5000):
+            ...
+
+        :param by: name of column to page through
+        :param page_size: number of models on each page
+        :param raw: raw connection if True, else the session transaction
+        :return: generator of lists of models (or tuples)
+        """
+        if self._type != 'SELECT':
+            raise self.ExpressionError(
+                'Only SELECT expressions can be paginated'
+            )
+        if by is None:
+            if len(self._table.primary_keys) != 1:
+                raise self.ExpressionError(
+                    'Unable to paginate {} without a column to order by'.format(self._table)
+                )
+            by=self._table.primary_keys[0].column_name
 
-            return self._generate_models(*raw_result)
+        index=None
+        if self._projected():
+            if by not in self._columns:
+                raise self.ExpressionError(
+                    'Unable to paginate by {}, it is not one of the selected columns'.format(by)
+                )
+            index=self._columns.index(by)
+
+        last=None
+        while True:
+            page=self._page(by, page_size, last).all(raw)
+            if len(page) != 0:
+                yield page
+            if len(page) < page_size:
+                return
+            last=getattr(page[-1], by) if index is None else page[-1][index]
+
+    def _page(self, by, page_size, last):
+        """
+        :return: copy of the expression selecting the page after last
+        """
+        e=copy(self)
+        e._sql=None
+        e._result=None
+        e._conditions=list(self._conditions) if self._conditions is not None else None
+        if e._conditions is not None and any(c.operator == 'OR' for c in e._conditions):
+            e._conditions[0]=copy(e._conditions[0])
+            e._conditions[-1]=copy(e._conditions[-1])
+            e._conditions[0].opens+=1
+            e._conditions[-1].closes+=1
+        if last is not None:
+            if e._conditions is None:
+                e._conditions=[]
+            e._conditions.append(self._Condition(
+                operator='AND' if len(e._conditions) != 0 else 'WHERE',
+                attribute=by,
+                attribute_table=self._resolve_attribute(by),
+                value=last,
+                comparison='>',
+            ))
+        e._order_by_column=by
+        e._limit=page_size
+        e._offset=None
+        return e
 
     def do(self, raw=True):
         """
@@ -683,6 +2405,26 @@ class Sql:
         """
         return self.first(raw)
 
+    async def first_async(self, raw=True):
+        """
+        Awaitable counterpart to first.
+        """
+        expressions=await self._split_expressions_async()
+        if len(expressions) > 1:
+            for e in expressions:
+                res=await e.first_async(raw)
+                if res is not None:
+                    return res
+            return None
+        res=await self._limit_first().all_async(raw)
+        return res[0] if res is not None and len(res) != 0 else None
+
+    async def do_async(self, raw=True):
+        """
+        Awaitable counterpart to do.
+        """
+        return await self.first_async(raw)
+
     def WHERE(self, *specified_conditions, **conditions):
         """
         Errors will be raised if the type of this expression is not
@@ -754,11 +2496,35 @@ class Sql:
         return self
 
     def OR(self, *specified_conditions, **conditions):
+        """
+        ORs conditions onto the expression. If more than one
+        condition is given, they are grouped and ANDed together.
+
+        Sql.SELECTFROM('Photo').WHERE(photoOwner='admin').OR(photoOwner='bob', caption__like='%cat%')
+        -> WHERE photoOwner = 'admin' OR (photoOwner = 'bob' AND caption LIKE '%cat%')
+        """
         if len(self._conditions) == 0:
             raise self.ExpressionError(
                 'Use where clause before applying an OR'
             )
-        self._add_condition('AND', *specified_conditions, **conditions)
+        start=len(self._conditions)
+        self._add_condition('OR', *specified_conditions, **conditions)
+        self._group_conditions(start, 'AND')
+        return self
+
+    def ANY(self, *specified_conditions, **conditions):
+        """
+        Adds a group of conditions where any one of them has to hold.
+        The group is ANDed with the conditions before it (or starts
+        the WHERE clause).
+
+        Sql.SELECTFROM('Photo').WHERE(photoOwner='admin').ANY(caption__isnull=True, caption='')
+        -> WHERE photoOwner = 'admin' AND (caption IS NULL OR caption = '')
+        """
+        first=self._conditions is None or len(self._conditions) == 0
+        start=0 if self._conditions is None else len(self._conditions)
+        self._add_condition('WHERE' if first else 'AND', *specified_conditions, **conditions)
+        self._group_conditions(start, 'OR')
         return self
 
     def SET(self, **kwargs):
@@ -801,6 +2567,37 @@ class Sql:
         self._order_by_column=column_name
         return self
 
+    def LIMIT(self, count, offset=None):
+        """
+        Limits a SELECT to count rows (optionally skipping offset rows first)
+
+        :param count: most rows to select
+        :param offset: rows to skip
+        :return: self
+        """
+        if self._type not in ('SELECT',):
+            raise self.ExpressionError(
+                'Invalid Experssion Type'
+            )
+        self._limit=count
+        if offset is not None:
+            self._offset=offset
+        return self
+
+    def OFFSET(self, count):
+        """
+        Skips the first count rows of a SELECT
+
+        :param count: rows to skip
+        :return: self
+        """
+        if self._type not in ('SELECT',):
+            raise self.ExpressionError(
+                'Invalid Experssion Type'
+            )
+        self._offset=count
+        return self
+
     def ONDUPUPDATE(self):
         if self._type != 'INSERT':
             raise self.ExpressionError(
@@ -838,6 +2635,33 @@ class Sql:
         e._insert_values=values
         return e
 
+    @staticmethod
+    def INSERT_MANY(*rows):
+        """
+        First method that should be called in a bulk INSERT expression.
+        Every row should be a dict with the same columns.
+
+        ex:
+
+        Sql.INSERT_MANY(
+            {'photoOwner': 'admin', 'caption': 'a'},
+            {'photoOwner': 'admin', 'caption': 'b'},
+        ).INTO('Photo').all()
+        """
+        e=Sql()
+        e._type='INSERT'
+        e._insert_rows=[dict(row) for row in rows]
+        if len(e._insert_rows) == 0:
+            raise e.ExpressionError(
+                'No rows given for INSERT_MANY expression'
+            )
+        e._insert_values=e._insert_rows[0]
+        if any(row.keys() != e._insert_values.keys() for row in e._insert_rows):
+            raise e.ExpressionError(
+                'All rows in INSERT_MANY expression need the same columns'
+            )
+        return e
+
     @staticmethod
     def SELECT(*columns):
         """
@@ -876,3 +2700,106 @@ class Sql:
         return Sql.execute_raw(
             sql, args
         )
+
+
+class CompiledSql:
+    """
+    An expression whose sql has been generated once, with Sql.param
+    placeholders in place of some of its values. Executing it only
+    needs the args to be filled in from the bindings.
+
+    sql    : generated sql
+    params : names of placeholders, in the order they appear in sql
+    """
+
+    def __init__(self, expression):
+        self.expression=expression
+        self._first=None
+        self.sql, args=expression.gen()
+        self._slots=tuple(
+            (True, arg.name) if isinstance(arg, Sql.Param) else (False, arg)
+            for arg in args
+        )
+        self.params=tuple(
+            value for is_param, value in self._slots if is_param
+        )
+        self._insert_slots=None if expression._insert_values is None else tuple(
+            (column, isinstance(value, Sql.Param), value)
+            for column, value in expression._insert_values.items()
+        )
+
+    def args(self, **bindings):
+        """
+        Builds the args for the compiled sql.
+
+        :param bindings: values for each placeholder
+        :return: [args]
+        """
+        try:
+            return [
+                bindings[value] if is_param else value
+                for is_param, value in self._slots
+            ]
+        except KeyError as e:
+            raise Sql.ExpressionError(
+                'No value bound for parameter {}'.format(e.args[0])
+            )
+
+    def _compile_first(self):
+        """
+        first reads one row, so SELECTs without a LIMIT are compiled
+        once more with LIMIT 1 the first time first is called.
+
+        :return: CompiledSql
+        """
+        if self._first is None:
+            e=copy(self.expression)
+            e._sql=None
+            e=e._limit_first()
+            self._first=self if e._limit is self.expression._limit else CompiledSql(e)
+        return self._first
+
+    def bind(self, **bindings):
+        """
+        Hands back a copy of the expression with its sql already
+        generated, ready to be executed like any other expression.
+
+        :param bindings: values for each placeholder
+        :return: Sql
+        """
+        e=copy(self.expression)
+        e._sql=(self.sql, self.args(**bindings))
+        e._result=None
+        if self._insert_slots is not None:
+            e._insert_values={
+                column: bindings[value.name] if is_param else value
+                for column, is_param, value in self._insert_slots
+            }
+        return e
+
+    def all(self, raw=True, **bindings):
+        return self.bind(**bindings).all(raw)
+
+    def first(self, raw=True, **bindings):
+        return self._compile_first().bind(**bindings).first(raw)
+
+    def do(self, raw=True, **bindings):
+        return self.bind(**bindings).do(raw)
+
+    def rowcount(self, raw=True, **bindings):
+        return self.bind(**bindings).rowcount(raw)
+
+    def tuples(self, raw=True, **bindings):
+        return self.bind(**bindings).tuples(raw)
+
+    def scalars(self, raw=True, **bindings):
+        return self.bind(**bindings).scalars(raw)
+
+    def namedtuples(self, raw=True, **bindings):
+        return self.bind(**bindings).namedtuples(raw)
+
+    async def all_async(self, raw=True, **bindings):
+        return await self.bind(**bindings).all_async(raw)
+
+    async def first_async(self, raw=True, **bindings):
+        return await self._compile_first().bind(**bindings).first_async(raw)
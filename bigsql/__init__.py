@@ -1,6 +1,6 @@
 from .types import StaticColumn, Integer, Text, Varchar, DateTime
 from .utils import strptime, classproperty
-from .Sql import Sql, Table, JoinedTable
+from .Sql import Sql, Table, JoinedTable, Schema, CompiledSql
 from .models import StaticModel, DynamicModel
 from .bigsql import big_SQL
 from .err import big_ERROR
@@ -0,0 +1,175 @@
+import asyncio
+import weakref
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql=None
+
+from . import Session
+from . import bigsql
+
+
+class AsyncConnection(object):
+    """
+    Simple wrapper for aiomysql connections. This mirrors
+    Session.Connection, but every operation is awaitable.
+    """
+
+    def __init__(self, conn):
+        self.conn=conn
+
+    async def commit_transaction(self):
+        """
+        commit transaction
+
+        :return:
+        """
+        await self.conn.commit()
+
+    async def rollback_transaction(self):
+        """
+        Rolls back transaction
+
+        :return:
+        """
+        if bigsql.config['VERBOSE_SQL_EXECUTION']:
+            msg='ROLLBACK;'
+            bigsql.logging.info(msg)
+        await self.conn.rollback()
+
+    async def execute(self, sql, args=None):
+        """
+        Executes raw sql, handing back the rows along with
+        the cursor metadata (see Session.Result).
+
+        :param str sql: raw sql statement
+        :param tuple args: tuple of arguments for sql statement
+        :return: Session.Result
+        """
+        if bigsql.config['VERBOSE_SQL_EXECUTION']:
+            msg='{} {}'.format(sql, args)
+            bigsql.logging.info(msg)
+
+        async with self.conn.cursor() as cursor:
+            await cursor.execute(sql, args)
+            res=Session.Result(await cursor.fetchall())
+            res.lastrowid=cursor.lastrowid
+            res.rowcount=cursor.rowcount
+        return res
+
+
+class AsyncConnectionPool(object):
+    """
+    Pool of aiomysql connections, sized by the same SQL_POOL_* options
+    as Session.ConnectionPool. The underlying pool is created the first
+    time a connection is needed, as it has to be made inside a running
+    event loop. aiomysql pools only work on the loop they were made on,
+    so each event loop (every asyncio.run...) gets a pool of its own.
+
+    This needs the optional aiomysql dependency (pip install bigsql[async]).
+    """
+    server_variables_sql=Session.ConnectionPool.server_variables_sql
+
+    class PoolError(Exception):
+        pass
+
+    def __init__(self, min_size=1, max_size=10, max_lifetime=3600):
+        self.min_size=min_size
+        self.max_size=max_size
+        self.max_lifetime=max_lifetime
+
+        self._pools=weakref.WeakKeyDictionary()
+        self._locks=weakref.WeakKeyDictionary()
+        self._server_variables=None
+
+    @staticmethod
+    def from_config():
+        """
+        Creates a pool sized by the SQL_POOL_* options in bigsql.config.
+
+        :return: AsyncConnectionPool
+        """
+        return AsyncConnectionPool(
+            min_size=bigsql.config['SQL_POOL_MIN_SIZE'],
+            max_size=bigsql.config['SQL_POOL_MAX_SIZE'],
+            max_lifetime=bigsql.config['SQL_POOL_MAX_LIFETIME'],
+        )
+
+    async def _get_pool(self):
+        loop=asyncio.get_running_loop()
+        pool=self._pools.get(loop)
+        if pool is not None:
+            return pool
+        if aiomysql is None:
+            raise self.PoolError(
+                'aiomysql is required for async queries (pip install bigsql[async])'
+            )
+        lock=self._locks.get(loop)
+        if lock is None:
+            lock=self._locks[loop]=asyncio.Lock()
+        async with lock:
+            if loop not in self._pools:
+                self._pools[loop]=await aiomysql.create_pool(
+                    minsize=self.min_size,
+                    maxsize=self.max_size,
+                    pool_recycle=-1 if self.max_lifetime is None else self.max_lifetime,
+                    host=bigsql.config['host'],
+                    password=bigsql.config['pword'],
+                    user=bigsql.config['user'],
+                    db=bigsql.config['db'],
+                    charset="utf8mb4",
+                    autocommit=False,
+                )
+        return self._pools[loop]
+
+    async def checkout(self):
+        """
+        :return: AsyncConnection
+        """
+        pool=await self._get_pool()
+        return AsyncConnection(await pool.acquire())
+
+    async def checkin(self, conn):
+        """
+        Hands a connection back to the pool.
+
+        :param conn: AsyncConnection from checkout
+        :return:
+        """
+        pool=await self._get_pool()
+        pool.release(conn.conn)
+
+    async def execute(self, sql, args=None):
+        """
+        Checks out a connection, runs sql and commits.
+
+        :return: Session.Result
+        """
+        conn=await self.checkout()
+        try:
+            res=await conn.execute(sql, args)
+            await conn.commit_transaction()
+        except Exception:
+            await conn.rollback_transaction()
+            raise
+        finally:
+            await self.checkin(conn)
+        return res
+
+    async def server_variables(self):
+        """
+        :return: max_allowed_packet, auto_increment_increment, innodb_autoinc_lock_mode
+        """
+        if self._server_variables is None:
+            self._server_variables=tuple((await self.execute(self.server_variables_sql))[0])
+        return self._server_variables
+
+    async def close(self):
+        """
+        Closes the pool for the running event loop.
+        """
+        pool=self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            pool.close()
+            await pool.wait_closed()
@@ -4,6 +4,7 @@ import warnings
 
 from . import Query
 from . import Session
+from . import aio
 from . import Sql
 from . import models
 
@@ -17,8 +18,30 @@ class DefaultConfig:
     VERBOSE_SQL_GENERATION=False
     VERBOSE_SQL_EXECUTION=True
 
-    SQL_CACHE_TIMEOUT=5
-    SQL_CACHE_ENABLED=True
+    SQL_CACHE_TIMEOUT=300
+    SQL_CACHE_SIZE=1024
+    SQL_CACHE_ENABLED=False
+    SQL_RESULT_CACHE_TIMEOUT=5
+    SQL_RESULT_CACHE_SIZE=256
+
+    SQL_UNIT_OF_WORK=True
+    SQL_WEAK_IDENTITY_MAP=False
+    SQL_AUTOFLUSH_LIMIT=None
+
+    SQL_REFLECT_SCHEMA=False
+    SQL_SCHEMA_SNAPSHOT=None
+
+    SQL_BULK_MAX_ROWS=1000
+    SQL_INSERT_REREAD=False
+
+    SQL_IN_CHUNK_SIZE=1000
+
+    SQL_POOL_MIN_SIZE=1
+    SQL_POOL_MAX_SIZE=10
+    SQL_POOL_IDLE_TIMEOUT=300
+    SQL_POOL_MAX_LIFETIME=3600
+    SQL_POOL_VALIDATE_AFTER=30
+    SQL_POOL_TIMEOUT=30
 
     def __iter__(self):
         yield from filter(
@@ -39,33 +62,100 @@ class big_SQL:
         config['host']=host
         config['db']=db
 
-        self.session=Session.Session()
+        Sql.Sql.configure_cache(
+            config['SQL_CACHE_TIMEOUT'],
+            config['SQL_CACHE_SIZE'],
+            config['SQL_RESULT_CACHE_TIMEOUT'],
+            config['SQL_RESULT_CACHE_SIZE'],
+        )
+
+        self.pool=Session.ConnectionPool.from_config()
+        self.aio_pool=aio.AsyncConnectionPool.from_config()
+        self.session=Session.ScopedSession(
+            lambda: Session.Session(self.pool, self.aio_pool),
+            self.pool,
+            self.aio_pool,
+        )
         Query.session=self.session
         Sql.Sql.session=self.session
 
         self.query=Query.Query
         self.sql=Sql.Sql
 
+        snapshot=config['SQL_SCHEMA_SNAPSHOT']
+        if snapshot is not None and os.path.exists(snapshot):
+            Sql.Schema.load(snapshot).install()
+        elif config['SQL_REFLECT_SCHEMA'] or snapshot is not None:
+            self.reflect()
+
         if 'LOG_DIR' in config:
             logging.basicConfig(filename=os.path.join(
                 config['LOG_DIR'],
                 'orm_log.log'
             ), filemode='w+', level='DEBUG')
 
+    @staticmethod
+    def reflect():
+        """
+        Reads the metadata for every table in the database in one go,
+        rather than one table at a time as they are used. If the
+        SQL_SCHEMA_SNAPSHOT option is set, the metadata is also written
+        there, so the next process can load it at startup instead.
+
+        :return: Sql.Schema
+        """
+        schema=Sql.Schema.reflect()
+        schema.install()
+        if config['SQL_SCHEMA_SNAPSHOT'] is not None:
+            schema.dump(config['SQL_SCHEMA_SNAPSHOT'])
+        return schema
+
+    @staticmethod
+    def invalidate(table):
+        """
+        Drops all cached metadata for table. Call this after altering it.
+
+        :param table: name of table (or model class)
+        """
+        Sql.Sql.invalidate(table if isinstance(table, str) else table.__name__)
+
+    @staticmethod
+    def invalidate_all():
+        """
+        Drops all cached metadata.
+        """
+        Sql.Sql.invalidate_all()
+
+    def init_app(self, app):
+        """
+        Tears down the session at the end of every request for a flask
+        app, so each request gets its own session and transaction.
+
+        :param app: flask.Flask
+        :return:
+        """
+        app.teardown_appcontext(
+            lambda exception: self.session.remove()
+        )
+
     @staticmethod
     def create_all():
         """
         Generates all create table sql, then runs it for
-        all models defined as subclasses of BaseModel.
+        all registered subclasses of StaticModel.
         """
         with warnings.catch_warnings():
             warnings.simplefilter("ignore")
-            for model_type in models.StaticModel.__subclasses__():
+            for model_type in list(models.ModelMeta.__registry__.values()):
+                if not issubclass(model_type, models.StaticModel):
+                    continue
                 raw=models.StaticModel.__table_sql__(model_type)
                 if raw is not None:
                     Sql.Sql.session.execute_raw(
                         raw
                     )
+        if Sql.Sql.__schema__ is not None:
+            big_SQL.reflect()
 
 
 config=None
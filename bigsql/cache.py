@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class Cache(object):
+    """
+    Thread safe LRU cache where every entry expires ttl seconds after
+    it was set. Entries are tagged with the names of the tables they
+    depend on, so everything that depends on a table can be dropped
+    with invalidate(table).
+
+    ttl     : seconds an entry lives for (None for no expiry)
+    maxsize : most entries held before the least recently used is evicted (None for no limit)
+    tags    : function that gives the tags for a key, used when set is not given any
+    hits    : number of lookups that found a live entry
+    misses  : number of lookups that did not
+    """
+    MISSING=object()
+
+    def __init__(self, ttl=None, maxsize=None, tags=None):
+        self.ttl=ttl
+        self.maxsize=maxsize
+        self.tags=tags if tags is not None else (lambda key: (key,))
+        self.hits=0
+        self.misses=0
+
+        self._entries=OrderedDict()
+        self._tagged={}
+        self._lock=threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not self.MISSING
+
+    def __getitem__(self, key):
+        value=self.get(key)
+        if value is self.MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def configure(self, ttl=None, maxsize=None):
+        """
+        Changes the ttl and size bound. Entries past the new
+        size bound are evicted right away.
+        """
+        with self._lock:
+            self.ttl=ttl
+            self.maxsize=maxsize
+            self._evict()
+
+    def get(self, key, default=MISSING):
+        """
+        :return: value for key, or default if it is missing or expired
+        """
+        with self._lock:
+            entry=self._entries.get(key)
+            if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry=None
+            if entry is None:
+                self.misses+=1
+                return default
+            self.hits+=1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, tags=None):
+        """
+        Adds value to the cache under key.
+
+        :param key: hashable key
+        :param value: anything
+        :param tags: names of tables value depends on, defaults to self.tags(key)
+        """
+        tags=tuple(self.tags(key) if tags is None else tags)
+        expires=None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key]=(expires, value, tags)
+            for tag in tags:
+                self._tagged.setdefault(tag, set()).add(key)
+            self._evict()
+
+    def invalidate(self, tag):
+        """
+        Drops every entry tagged with tag.
+
+        :param tag: name of table
+        :return: number of entries dropped
+        """
+        with self._lock:
+            keys=self._tagged.pop(tag, set())
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        """
+        Drops every entry. Counters are left alone.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._tagged.clear()
+
+    def info(self):
+        """
+        :return: dict of hits, misses and current size
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+        }
+
+    def _remove(self, key):
+        expires, value, tags=self._entries.pop(key)
+        for tag in tags:
+            tagged=self._tagged.get(tag)
+            if tagged is not None:
+                tagged.discard(key)
+                if len(tagged) == 0:
+                    del self._tagged[tag]
+
+    def _evict(self):
+        if self.maxsize is None:
+            return
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
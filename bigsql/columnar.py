@@ -0,0 +1,121 @@
+import array
+
+try:
+    import numpy
+except ImportError:
+    numpy=None
+
+
+class ColumnarError(Exception):
+    pass
+
+
+class ColumnBuffer(object):
+    """
+    Values for one column of a result. Numeric columns are held in a
+    typed array.array (with 0 in place of NULL), and anything else in
+    a list. If a value does not fit the typed buffer (an unsigned BIGINT
+    past 2**63...), the buffer falls back to a list.
+
+    name     : name of column
+    typecode : array typecode, or None if values is a list
+    values   : array.array or list
+    mask     : bytearray, 1 for every NULL
+    """
+    typecodes={
+        'tinyint'  : 'q',
+        'smallint' : 'q',
+        'mediumint': 'q',
+        'int'      : 'q',
+        'bigint'   : 'q',
+        'year'     : 'q',
+        'float'    : 'd',
+        'double'   : 'd',
+        'real'     : 'd',
+    }
+
+    def __init__(self, name, column=None):
+        self.name=name
+        self.typecode=self.typecodes.get(getattr(column, 'type_name', None))
+        self.values=array.array(self.typecode) if self.typecode is not None else []
+        self.mask=bytearray()
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def nulls(self):
+        """
+        :return: number of NULLs in the column
+        """
+        return self.mask.count(1)
+
+    def extend(self, values):
+        """
+        Adds a batch of values to the end of the column.
+
+        :param values: sequence of values
+        :return:
+        """
+        if self.typecode is not None:
+            size=len(self.values)
+            try:
+                self.values.extend([0 if value is None else value for value in values])
+            except (TypeError, OverflowError):
+                del self.values[size:]
+                self.values=[None if null else value for value, null in zip(self.values, self.mask)]
+                self.typecode=None
+        if self.typecode is None:
+            self.values.extend(values)
+        self.mask.extend(value is None for value in values)
+
+    def to_numpy(self):
+        """
+        Typed columns become numpy arrays over the same memory (masked
+        arrays if they hold any NULLs), anything else an object array.
+
+        :return: numpy.ndarray
+        """
+        require_numpy()
+        if self.typecode is None:
+            values=numpy.empty(len(self.values), dtype=object)
+            values[:]=self.values
+            return values
+        if len(self.values) == 0:
+            return numpy.empty(0, dtype=self.typecode)
+        values=numpy.frombuffer(self.values, dtype=self.typecode)
+        if self.nulls != 0:
+            return numpy.ma.masked_array(values, mask=numpy.frombuffer(self.mask, dtype=bool))
+        return values
+
+
+def require_numpy():
+    if numpy is None:
+        raise ColumnarError(
+            'numpy is required for numpy exports (pip install bigsql[numpy])'
+        )
+
+
+def read_columns(columns, batches):
+    """
+    Reads batches of rows into a ColumnBuffer for each column. Columns
+    with the same name in more than one table are keyed as table.column.
+
+    :param columns: reflected column for each value in a row
+    :param batches: iterable of lists of rows
+    :return: dict of column name to ColumnBuffer
+    """
+    buffers={}
+    for column in columns:
+        name=column.column_name
+        if name in buffers:
+            name='{}.{}'.format(column.table_name, column.column_name)
+        buffers[name]=ColumnBuffer(name, column)
+
+    ordered=list(buffers.values())
+    for rows in batches:
+        if len(rows) == 0:
+            continue
+        for buffer, values in zip(ordered, zip(*rows)):
+            buffer.extend(values)
+    return buffers
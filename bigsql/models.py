@@ -1,21 +1,70 @@
+import weakref
+
 from . import Query
 from . import Sql
 from . import types
 from . import utils
 from . import bigsql
 
-from copy import deepcopy
 
+class ModelMeta(type):
+    """
+    Metaclass for models. Every model is added to the registry under
+    the name of its table when the class is defined, so finding the
+    model for a table is a dict lookup (see Sql._resolve_model).
+
+    Static columns are named right away, and if the tables metadata has
+    already been reflected (see big_SQL.reflect), the class is bound then
+    and there. Otherwise it is bound the first time it is used.
+
+    Classes with __register__=False in their body (the base models, and
+    the classes generated by TempModel) are left out of the registry.
 
-class DynamicModel(object):
+    Subclasses of StaticModel that do not declare __slots__ are given
+    __slots__=(), so instances only hold their column values.
+    """
+    __registry__=weakref.WeakValueDictionary()
+
+    def __new__(mcs, name, bases, namespace):
+        if '__slots__' not in namespace and any(issubclass(base, StaticModel) for base in bases):
+            namespace=dict(namespace, __slots__=())
+        return super(ModelMeta, mcs).__new__(mcs, name, bases, namespace)
+
+    def __init__(cls, name, bases, namespace):
+        super(ModelMeta, cls).__init__(name, bases, namespace)
+        if not namespace.get('__register__', True):
+            return
+        for attr, value in namespace.items():
+            if isinstance(value, types.StaticColumn):
+                value.set_name(attr, name)
+        ModelMeta.__registry__[name]=cls
+        if name in Sql.Sql.__cache__['tables']:
+            cls.__bind__()
+
+
+class DynamicModel(object, metaclass=ModelMeta):
     """
     All subclasses just need to define their own __name__
     to be the name of the table (along with any other convince
     methods).
     """
+    __register__=False
+    __slots__=('__values__', '__changes__', '__dirty_columns__', '__collections__', '__weakref__')
+    __bound_attrs__=(
+        '__table__', '__column_info__', '__relationships__', '__lower_relationships__',
+        '__column_lot__', '__column_names__', '__primary_keys__', '__primary_key_index__',
+        '__column_index__',
+    )
+
+    __table__=None
     __column_info__: list = None
     __relationships__: dict = None
+    __lower_relationships__: dict = None
+    __column_lot__: dict = None
+    __column_names__: tuple = None
+    __column_index__: dict = None
     __primary_keys__: tuple = None
+    __primary_key_index__: tuple = None
 
     class ModelError(Exception):
         pass
@@ -23,6 +72,8 @@ class DynamicModel(object):
     class EmptyValue:
         pass
 
+    __empty__=EmptyValue()
+
     class Relationship:
         """
         class BaseModel:
@@ -32,60 +83,198 @@ class DynamicModel(object):
             }
         """
 
-        def __init__(self, model_obj, foreign_table):
+        def __init__(self, model_obj, foreign_table, objs=None):
             self.model_obj = model_obj
             self.foreign_table = Sql.Table(foreign_table)
-            self._objs = None
+            self._objs = None if objs is None else list(dict.fromkeys(objs))
 
         def __iter__(self):
             """
             yeild foreign table object specified my relationship
+
+            The objects are loaded the first time, and kept until the
+            session drops the collection (see Session.cache_collection).
             :return:
             """
 
             if self._objs is None:
-                ref, curr = Sql.JoinedTable.resolve_attribute(
-                    self.foreign_table.name,
-                    self.model_obj.__name__,
-                )
+                self._objs = list(dict.fromkeys(self._select().all()))
+
+            yield from self._objs
+
+        async def __aiter__(self):
+            """
+            async counterpart to __iter__
+
+            async for photo in person.photos:
+                ...
+            """
+            if self._objs is None:
+                self._objs = list(dict.fromkeys(await self._select().all_async()))
+
+            for o in self._objs:
+                yield o
+
+        def _query(self):
+            """
+            :return: Sql expression selecting the foreign objects, without the join
+            """
+            ref, curr = Sql.JoinedTable.resolve_attribute(
+                self.foreign_table.name,
+                self.model_obj.__name__,
+            )
+            return Sql.Sql.SELECTFROM(self.foreign_table.name).WHERE(**{
+                ref: self.model_obj.__getattr__(curr)
+            })
+
+        def count(self):
+            """
+            Counts the foreign objects. This is done on the server
+            unless they have already been loaded.
+            """
+            if self._objs is not None:
+                return len(self._objs)
+            return self._query().count()
+
+        def exists(self):
+            if self._objs is not None:
+                return len(self._objs) != 0
+            return self._query().exists()
+
+        def aggregate(self, function, column='*'):
+            """
+            Runs function(column) over the foreign objects on the server (see Sql.aggregate)
+            """
+            return self._query().aggregate(function, column)
+
+        def sum(self, column):
+            return self.aggregate('SUM', column)
+
+        def min(self, column):
+            return self.aggregate('MIN', column)
 
-                self._objs = Sql.Sql.SELECTFROM(
-                    self.foreign_table.name
-                ).JOIN(self.model_obj.__name__).WHERE(
-                    '{table}.{primarykey}={value}'.format(
-                        table=self.foreign_table.name,
-                        primarykey=ref,
-                        value=self.model_obj.__getattr__(curr)
-                    )
-                ).all()
+        def max(self, column):
+            return self.aggregate('MAX', column)
 
-            yield from set(self._objs)
+        def avg(self, column):
+            return self.aggregate('AVG', column)
+
+        def _select(self):
+            """
+            :return: Sql expression selecting the foreign objects
+            """
+            ref, curr = Sql.JoinedTable.resolve_attribute(
+                self.foreign_table.name,
+                self.model_obj.__name__,
+            )
+
+            return Sql.Sql.SELECTFROM(
+                self.foreign_table.name
+            ).JOIN(self.model_obj.__name__).WHERE(
+                '{table}.{primarykey}={value}'.format(
+                    table=self.foreign_table.name,
+                    primarykey=ref,
+                    value=self.model_obj.__getattr__(curr)
+                )
+            )
 
     def __init__(self, **kwargs):
         """
         Will fetch names of columns when initially called.
 
-        :param list args: list of data members for object in order they were created.
+        :param kwargs: column values for the model
         """
-        self.__table__ = Sql.Table(self.__name__)
-        self.__column_info__ = self.__table__.columns
-        self.__relationships__ = self.__table__.relationships
-        self.__lower_relationships__ = {
+        cls=self.__bind__()
+        values=[cls.__empty__] * len(cls.__column_names__)
+        for key, value in kwargs.items():
+            if key not in cls.__column_index__:
+                raise self.ModelError('{} has no column {}'.format(cls.__name__, key))
+            values[cls.__column_index__[key]]=value
+        self.__set_model_state__(values)
+
+    @classmethod
+    def __bind__(cls):
+        """
+        Works out the column and key metadata for the models table.
+        This happens once per class, the first time it is needed, and
+        is then shared by every instance. Instances only hold a list
+        of column values, in the order of cls.__column_names__.
+
+        :return: cls
+        """
+        if '__column_index__' in cls.__dict__:
+            return cls
+        table=Sql.Table(cls.__name__)
+        cls.__table__=table
+        cls.__column_info__=table.columns
+        cls.__relationships__=table.relationships
+        cls.__lower_relationships__={
             rel.lower(): rel
-            for rel in self.__relationships__
+            for rel in table.relationships
         }
-        self.__column_lot__ = {
+        cls.__column_lot__={
             col.column_name: col
-            for col in self.__column_info__
+            for col in table.columns
         }
-        self.__primary_keys__ = tuple(filter(
-            lambda column: column.primary_key,
-            self.__column_info__
-        ))
+        cls.__column_names__=tuple(
+            col.column_name
+            for col in table.columns
+        )
+        cls.__primary_keys__=tuple(table.primary_keys)
+        cls.__primary_key_index__=tuple(
+            cls.__column_names__.index(col.column_name)
+            for col in cls.__primary_keys__
+        )
+        for index, name in enumerate(cls.__column_names__):
+            attribute=getattr(cls, name, None)
+            if isinstance(attribute, types.StaticColumn) and name in cls.__dict__:
+                attribute.set_name(name, cls.__name__).index=index
+            elif attribute is None or isinstance(attribute, types.ColumnAttribute):
+                setattr(cls, name, types.ColumnAttribute(name, index))
+        cls.__column_index__={
+            name: index
+            for index, name in enumerate(cls.__column_names__)
+        }
+        return cls
 
-        self.__original_state__=kwargs
-        self.__current_state__=deepcopy(kwargs)
-        self.__set_model_state__(**kwargs)
+    @classmethod
+    def __unbind__(cls):
+        """
+        Drops the metadata worked out by __bind__, so it is worked
+        out again the next time the class is used (see Sql.invalidate).
+        """
+        for attr in DynamicModel.__bound_attrs__:
+            if attr in cls.__dict__:
+                delattr(cls, attr)
+        for name, attribute in list(cls.__dict__.items()):
+            if isinstance(attribute, types.StaticColumn):
+                attribute.index=None
+            elif isinstance(attribute, types.ColumnAttribute):
+                delattr(cls, name)
+
+    @classmethod
+    def __from_row__(cls, row):
+        """
+        Builds a model straight from a row of values in column order,
+        without going through __init__. cls needs to be bound already.
+
+        :param row: tuple of column values
+        :return: model
+        """
+        o=object.__new__(cls)
+        o.__set_model_state__(list(row))
+        return o
+
+    def __set_model_state__(self, values):
+        """
+        Change tracking is copy on write. __changes__ and __dirty_columns__
+        stay None until a column is first modified, so models that are
+        only read carry nothing extra.
+        """
+        self.__values__=values
+        self.__changes__=None
+        self.__dirty_columns__=None
+        self.__collections__=None
 
     def __str__(self):
         return '<{}Model: {}>'.format(
@@ -99,30 +288,59 @@ class DynamicModel(object):
             ))
         )
 
+    @property
+    def __primary_key_values__(self):
+        values=self.__values__
+        return tuple(values[index] for index in self.__primary_key_index__)
+
+    @property
+    def __identity__(self):
+        """
+        :return: table name and primary key values, or None if the keys are not set yet
+        """
+        key=self.__primary_key_values__
+        if any(isinstance(value, self.EmptyValue) for value in key):
+            return None
+        return self.__table__.name, key
+
     def __hash__(self):
-        return hash(str(self.__current_state__))
+        identity=self.__identity__
+        return hash(identity) if identity is not None else id(self)
 
     def __eq__(self, other):
-        return other.__table__.name == self.__table__.name and all(
-            self.__getattr__(pri) == other.__getattr__(pri)
-            for pri in self.__primary_keys__.keys()
-        )
+        if self is other:
+            return True
+        if not isinstance(other, DynamicModel):
+            return NotImplemented
+        identity=self.__identity__
+        return identity is not None and identity == other.__identity__
 
     def __ne__(self, other):
         return not (self == other)
 
-    def __setattr__(self, key, value):
+    def __set_column__(self, index, key, value):
         """
-        Overriding this method is necessary because the models state needs to
-        be update in the database if a column attribute is modified.
-        """
-        if 'primary_keys' in self.__dict__ and key in self.__dict__['primary_keys']:
-            raise self.__dict__['ModelError']('Unable to modify primary key value')
-        if '__current_state__' in self.__dict__ and key in self.__current_state__:
-            self.__current_state__[key] = value
-            Sql.Sql.session.orm_conn.execute(*self.__update_sql__)
+        Called by the column descriptors when a column attribute is
+        modified, as the models state needs to be update in the database.
 
-        self.__dict__[key] = value
+        :param index: position of the column in self.__values__
+        :param key: name of the column
+        :param value: new value
+        """
+        if self.__changes__ is None:
+            self.__changes__={}
+        if index not in self.__changes__:
+            self.__changes__[index]=self.__values__[index]
+        self.__values__[index]=value
+
+        if bigsql.config['SQL_UNIT_OF_WORK']:
+            if self.__dirty_columns__ is None:
+                self.__dirty_columns__=set()
+            self.__dirty_columns__.add(key)
+            Sql.Sql.session.mark_dirty(self)
+        else:
+            Sql.Sql.session.execute(*self.__update_sql__)
+            Sql.Sql.session.wrote(self.__table__.name)
 
     def __getattr__(self, item):
         """
@@ -130,8 +348,10 @@ class DynamicModel(object):
         of a table that has a reference to the current model, a self.Relationship
         obejct will be returned.
 
-        Alternatively, if item is the name of a column for this model, its current
-        value will be read out of self.__current_state__ and returned. Be warned
+        Column attributes are normally read through the descriptors put on the
+        class by __bind__. If item is the name of a column that has no descriptor
+        (or __getattr__ is called directly), its current value will be read out
+        of self.__values__ and returned. Be warned
         that if the column attribute has not been set, it is likely that you will
         get a self.EmptyValue object returned.
 
@@ -139,37 +359,76 @@ class DynamicModel(object):
         """
         if item == '__name__':  # boy this is a messy fix
             return self.__class__.__name__
+        if item.startswith('__'):
+            raise AttributeError('Attribute not found {}'.format(item))
+
+        column_index=self.__bind__().__column_index__
+        if item in column_index:
+            return self.__values__[column_index[item]]
+
+        foreign_table=self.__relationship_table__(item)
+        if foreign_table is not None:
+            if self.__collections__ is not None and foreign_table in self.__collections__:
+                return self.__collections__[foreign_table]
+            return Sql.Sql.session.cache_collection(
+                self,
+                foreign_table,
+                self.Relationship(self, foreign_table)
+            )
+        raise AttributeError('Attribute not found {}'.format(item))
 
-        if '__current_state__' in self.__dict__ and item in self.__current_state__:
-            return self.__current_state__[item]
+    @classmethod
+    def __relationship_table__(cls, item):
+        """
+        Resolves a relationship attribute (like photo or photos)
+        to the name of the table that references this model.
 
-        if self.__lower_relationships__ is not None:
-            if item in self.__lower_relationships__:
-                return self.Relationship(
-                    self,
-                    self.__lower_relationships__[item]
-                )
-            elif item.endswith('s') and item[:-1] in self.__lower_relationships__:
-                return self.Relationship(
-                    self,
-                    self.__lower_relationships__[item[:-1]]
-                )
-        raise AttributeError('Attribute not found {}'.format(item))
+        :param item: name of relationship
+        :return: name of foreign table, or None
+        """
+        lower_relationships=cls.__bind__().__lower_relationships__
+        if item in lower_relationships:
+            return lower_relationships[item]
+        elif item.endswith('s') and item[:-1] in lower_relationships:
+            return lower_relationships[item[:-1]]
+        return None
+
+    @property
+    def __current_state__(self):
+        """
+        :return: dict of column name to current value
+        """
+        return dict(zip(self.__column_names__, self.__values__))
+
+    @property
+    def __original_state__(self):
+        """
+        :return: dict of column name to value as of the last commit
+        """
+        values=list(self.__values__)
+        for index, original in (self.__changes__ or {}).items():
+            values[index]=original
+        return dict(zip(self.__column_names__, values))
 
     def __rollback__(self):
         """
-        This rolls back the models state to the __original_state__ dictionary.
-        __rollback__ will be called on all tracked models in the db.session if
-        db.session.rollback is called.
+        This rolls back the models state to the values it had before
+        it was first modified. __rollback__ will be called on all tracked
+        models in the db.session if db.session.rollback is called.
         :return:
         """
-        self.__current_state__ = deepcopy(self.__original_state__)
+        if self.__changes__ is not None:
+            for index, original in self.__changes__.items():
+                self.__values__[index]=original
+        self.__commit__()
 
-    def __set_model_state__(self, **kwargs):
-        for col in self.__column_info__:
-            self.__current_state__[col.column_name]=self.EmptyValue()
-        for col, val in kwargs.items():
-            self.__current_state__[col]=val
+    def __commit__(self):
+        """
+        Forgets the original values once the changes are commited.
+        :return:
+        """
+        self.__changes__=None
+        self.__dirty_columns__=None
 
     @staticmethod
     def __table_sql__(class_type):
@@ -226,7 +485,7 @@ class DynamicModel(object):
 
     @property
     def __insert_update__(self):
-        return Sql.INSERT(**{
+        return Sql.Sql.INSERT(**{
             key: value
             for key, value in self.__current_state__.items()
             if not isinstance(value, self.EmptyValue)
@@ -269,18 +528,43 @@ class DynamicModel(object):
         ** This will rely on primary keys to update the object. If
         primary keys are modified, this will likely crash.
 
+        ** Columns that have not been read yet (server defaults
+        of a model hydrated from lastrowid) are left out, like in
+        __insert_sql__.
+
         :return:
         """
         return Sql.Sql.UPDATE(self.__name__).SET(**{
-            col.column_name: self.__getattr__(col.column_name)
-            for col in self.__column_info__
-            if not col.primary_key
+            column_name: value
+            for column_name, value in (
+                (col.column_name, self.__getattr__(col.column_name))
+                for col in self.__column_info__
+                if not col.primary_key
+            )
+            if not isinstance(value, self.EmptyValue)
         }).WHERE(**{
             col.column_name: self.__getattr__(col.column_name)
             for col in self.__column_info__
             if col.primary_key
         }).gen()
 
+    @property
+    def __flush_sql__(self):
+        """
+        generate sql to write the columns modified since the last
+        flush in a single UPDATE. Used by the session when running
+        in unit of work mode.
+
+        :return: sql, args
+        """
+        return Sql.Sql.UPDATE(self.__name__).SET(**{
+            column_name: self.__getattr__(column_name)
+            for column_name in self.__dirty_columns__
+        }).WHERE(**{
+            col.column_name: self.__getattr__(col.column_name)
+            for col in self.__primary_keys__
+        }).gen()
+
     @property
     def __delete_sql__(self):
         """
@@ -296,32 +580,53 @@ class DynamicModel(object):
 
     @property
     def __modified__(self):
-        return any(
-            getattr(self, key) != self.__original_state__[key]
-            for key in self.__original_state__
+        return self.__changes__ is not None and any(
+            self.__values__[index] != original
+            for index, original in self.__changes__.items()
         )
 
-    def __update_current_state(self):
-        self.__original_state__ = deepcopy(self.__current_state__)
-
-
 
 class TempModel(DynamicModel):
     """
-    A temporary model
+    A temporary model, used for tables that do not have a model
+    defined. One subclass of TempModel is generated per table (see
+    __for_table__), so the table metadata lives on that class rather
+    than on every instance.
     """
+    __register__=False
+    __slots__=()
+    __generated__={}
+
+    def __new__(cls, table_name=None, **kwargs):
+        if cls is TempModel:
+            cls=TempModel.__for_table__(table_name)
+        return object.__new__(cls)
 
-    def __init__(self, table_name, **kwargs):
-        self.__name__ = table_name
+    def __init__(self, table_name=None, **kwargs):
         super(TempModel, self).__init__(**kwargs)
 
+    @staticmethod
+    def __for_table__(table_name):
+        """
+        :param table_name: name of table
+        :return: bound TempModel subclass for table_name
+        """
+        Model=TempModel.__generated__.get(table_name)
+        if Model is None:
+            Model=TempModel.__generated__.setdefault(table_name, type(
+                table_name,
+                (TempModel,),
+                {'__slots__': (), '__module__': __name__, '__register__': False}
+            ))
+        return Model.__bind__()
+
     def __str__(self):
         return '<Temp{}Model: {}>'.format(
             self.__name__,
             '{{\n{}\n}}'.format(',\n'.join(
                 '    {:12}: {}'.format(
                     col.column_name,
-                    str(self.__current_state__[col.column_name])
+                    str(getattr(self, col.column_name))
                 )
                 for col in self.__column_info__
             ))
@@ -329,21 +634,18 @@ class TempModel(DynamicModel):
 
 
 class StaticModel(DynamicModel):
+    """
+    Base for user defined models. Like every model, instances only hold
+    a list of column values; subclasses get __slots__=() from ModelMeta
+    unless they declare their own.
+    """
+    __register__=False
+    __slots__=()
+
     def __init__(self, **kwargs):
         super(StaticModel, self).__init__(**kwargs)
-        self.__current_state__ = deepcopy(kwargs)
         self.__initialize_state__()
 
-    def __getattribute__(self, item):
-        if '__column_info__' in super(StaticModel, self).__getattribute__('__dict__'):
-            col_names = list(map(
-                lambda col: col.column_name,
-                super(StaticModel, self).__getattribute__('__column_info__')
-            ))
-            if item in col_names:
-                return self.__getattr__(item)
-        return super(StaticModel, self).__getattribute__(item)
-
     def __initialize_state__(self):
         m = Sql.Sql.INSERT(**{
             key: value
@@ -352,5 +654,8 @@ class StaticModel(DynamicModel):
         }).INTO(
             self.__class__.__name__
         ).do()
-        for key, value in m.__current_state__.items():
-            self.__current_state__[key] = value
+        self.__set_model_state__(list(m.__values__))
+        tracker=Sql.Sql.session.object_tracker
+        if m in tracker:
+            tracker.delete(m)
+            tracker.add(self)
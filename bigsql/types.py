@@ -3,6 +3,8 @@ from dataclasses import dataclass
 
 from scanf import scanf
 
+from .utils import strptime
+
 
 @dataclass
 class DataType:
@@ -42,7 +44,59 @@ class Varchar(DataType):
     name: str='VARCHAR'
 
 
-class StaticColumn:
+class Float(DataType):
+    name: str='FLOAT'
+
+
+class Double(DataType):
+    name: str='DOUBLE'
+
+
+class Decimal(DataType):
+    name: str='DECIMAL'
+
+
+class Reflected(DataType):
+    """
+    Type of a reflected column that bigsql has no DataType for
+    (DATE, ENUM, BLOB...). It just keeps the name of the type.
+    """
+
+    def __init__(self, type_name):
+        self.name=type_name.upper()
+
+
+class ColumnAttribute(object):
+    """
+    Data descriptor for a column of a model class. One is put on the
+    class for each column when the class is bound (see DynamicModel.__bind__),
+    so reading obj.column is a list lookup, and assigning to it goes
+    straight to the models change tracking.
+
+    column_name : name of the column
+    index       : position of the column in the models values
+    """
+    column_name: str=None
+    index: int=None
+
+    def __init__(self, column_name, index):
+        self.column_name=column_name
+        self.index=index
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        if self.index is None:
+            type(obj).__bind__()
+        return obj.__values__[self.index]
+
+    def __set__(self, obj, value):
+        if self.index is None:
+            type(obj).__bind__()
+        obj.__set_column__(self.index, self.column_name, value)
+
+
+class StaticColumn(ColumnAttribute):
     """
     StaticColumn holds information about user defined columns.
     This object should be used to define columns in statically defined models.
@@ -81,14 +135,26 @@ class StaticColumn:
 
     @staticmethod
     def resolve_type(type_name):
+        """
+        :param type_name: DATA_TYPE from INFORMATION_SCHEMA.COLUMNS
+        :return: DataType, or Reflected for types that are not mapped
+        """
         return {
             'int'      : Integer,
             'tinyint'  : Integer,
+            'smallint' : Integer,
+            'mediumint': Integer,
+            'bigint'   : Integer,
             'text'     : Text,
             'varchar'  : Varchar(128),
             'timestamp': DateTime,
             'datetime' : DateTime,
-        }[type_name]
+            'float'    : Float,
+            'double'   : Double,
+            'real'     : Double,
+            'decimal'  : Decimal,
+            'numeric'  : Decimal,
+        }.get(type_name) or Reflected(type_name)
 
     @property
     def sql(self):
@@ -115,9 +181,52 @@ class StaticColumn:
 
 @dataclass
 class DynamicColumn(StaticColumn):
-    def __init__(self, table_name, column_name, data_type, primary_key):
+    """
+    Column reflected from INFORMATION_SCHEMA.COLUMNS.
+
+    default       : default value for the column (if default_known)
+    default_known : whether the default can be worked out client side. This
+                    is False for defaults generated by the server (CURRENT_TIMESTAMP...)
+    """
+    integer_types=('int', 'tinyint', 'smallint', 'mediumint', 'bigint')
+
+    def __init__(self, table_name, column_name, data_type, primary_key, default=None, nullable='YES', extra=''):
+        extra=(extra or '').lower()
         super(DynamicColumn, self).__init__(
             self.resolve_type(data_type),
-            primary_key=primary_key == 'PRI'
+            primary_key=primary_key == 'PRI',
+            nullable=nullable == 'YES',
+            auto_increment='auto_increment' in extra,
         )
         self.set_name(column_name, table_name)
+        self.type_name=data_type
+        self.default, self.default_known=self.resolve_default(
+            default, data_type, self.nullable, extra
+        )
+
+    @staticmethod
+    def resolve_default(default, type_name, nullable, extra=''):
+        """
+        Turns COLUMN_DEFAULT into a python value. MariaDB quotes literal
+        defaults and hands back 'NULL', while MySQL does neither, so
+        both are handled here.
+
+        :return: default, default_known
+        """
+        if default is None or default == 'NULL':
+            return None, nullable
+        if 'default_generated' in extra or '(' in default or default.upper().startswith('CURRENT_TIMESTAMP'):
+            return None, False
+        if len(default) >= 2 and default[0] == default[-1] == "'":
+            default=default[1:-1].replace("''", "'")
+        if type_name in DynamicColumn.integer_types:
+            try:
+                return int(default), True
+            except ValueError:
+                return None, False
+        if type_name in ('timestamp', 'datetime'):
+            try:
+                return strptime(default), True
+            except ValueError:
+                return None, False
+        return default, True
@@ -8,4 +8,8 @@ setup(
     description='Just another ORM',
     packages=['bigsql'],
     install_requires=['flask-mysql==1.4.0', 'pymysql==0.9.3', 'scanf==1.5.2'],
+    extras_require={
+        'async': ['aiomysql==0.0.21'],
+        'numpy': ['numpy>=1.16'],
+    },
 )
@@ -93,3 +93,16 @@ CREATE TABLE Comment
     FOREIGN KEY (photoID) REFERENCES Photo (photoID) ON DELETE CASCADE,
     FOREIGN KEY (username) REFERENCES Person (username) ON DELETE CASCADE
 );
+
+CREATE TABLE Metric
+(
+    metricID int NOT NULL AUTO_INCREMENT,
+    value    DOUBLE,
+    ratio    FLOAT,
+    amount   DECIMAL(10, 2),
+    day      DATE,
+    kind     ENUM ('a', 'b'),
+    code     CHAR(2),
+    data     BLOB,
+    PRIMARY KEY (metricID)
+);
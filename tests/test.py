@@ -1,11 +1,566 @@
-from bigsql import big_SQL
-from bigsql.models import StaticModel
+from bigsql import big_SQL, Sql, Table, JoinedTable, Schema
+from bigsql import aio, bigsql, columnar
+from bigsql.bigsql import DefaultConfig
+from bigsql.cache import Cache
+from bigsql.models import ModelMeta, StaticModel
+from bigsql.Session import Connection, ConnectionPool
 from bigsql.types import StaticColumn, Integer, Varchar, TimeStamp
 from bigsql.err import big_ERROR
+from contextlib import contextmanager
 from datetime import datetime
 
+import asyncio
+import gc
+import json
+import os
+import re
 import string
 import random
+import tempfile
+import threading
+import time
+
+
+@contextmanager
+def statements():
+    executed=[]
+    execute=Connection.execute
+
+    def record(conn, sql, args=None):
+        executed.append(sql)
+        return execute(conn, sql, args)
+
+    Connection.execute=record
+    try:
+        yield executed
+    finally:
+        Connection.execute=execute
+
+
+def check_registry(db, model):
+    assert ModelMeta.__registry__[model.__name__] is model
+    assert not {'DynamicModel', 'StaticModel', 'TempModel'} & set(ModelMeta.__registry__)
+    with statements() as executed:
+        db.create_all()
+    assert any(
+        sql.startswith('CREATE TABLE IF NOT EXISTS {} ('.format(model.__name__))
+        for sql in executed
+    )
+
+
+def test_cache():
+    cache=Cache(ttl=0.05, maxsize=2)
+    cache['a']=1
+    cache.set('b', 2, tags=('Photo',))
+    assert cache['a'] == 1
+    cache['c']=3
+    assert 'b' not in cache
+    assert cache.invalidate('Photo') == 0
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+    cache.set('d', 4, tags=('Photo', 'Person'))
+    assert 'a' not in cache
+    assert cache.invalidate('Person') == 1
+    assert cache.invalidate('Photo') == 0
+    assert 'd' not in cache
+
+    time.sleep(0.1)
+    assert cache.get('c', None) is None
+    assert cache.info() == {'hits': 3, 'misses': 4, 'size': 0}
+
+    cache.configure(None, 1)
+    cache['a']=1
+    cache['b']=2
+    time.sleep(0.1)
+    assert 'a' not in cache and cache['b'] == 2
+    cache.clear()
+    assert len(cache) == 0 and cache.hits == 4
+
+
+def check_result_cache(db, username):
+    bigsql.config['SQL_CACHE_ENABLED']=True
+    try:
+        photos=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username)
+        count=len(photos.all())
+        hits=Sql.__results__.hits
+        with statements() as executed:
+            assert len(db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).all()) == count
+        assert executed == [] and Sql.__results__.hits == hits + 1
+
+        db.sql.INSERT(photoOwner=username).INTO('Photo').do()
+        assert len(db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).all()) == count + 1
+
+        photo=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).first()
+        assert db.sql.SELECTFROM('Photo').WHERE(photoID=photo.photoID).first().caption != 'cached'
+        bigsql.config['SQL_UNIT_OF_WORK']=False
+        photo.caption='cached'
+        db.session.commit()
+        assert db.sql.SELECTFROM('Photo').WHERE(photoID=photo.photoID).first().caption == 'cached'
+    finally:
+        bigsql.config['SQL_CACHE_ENABLED']=False
+        bigsql.config['SQL_UNIT_OF_WORK']=True
+
+
+def check_pool():
+    pool=ConnectionPool(min_size=0, max_size=1, timeout=0.1)
+    conn=pool.checkout()
+    assert len(pool) == 1
+    try:
+        pool.checkout()
+        assert False
+    except ConnectionPool.PoolError:
+        pass
+    pool.checkin(conn)
+    assert pool.checkout() is conn
+    pool.checkin(conn)
+    pool.close()
+    assert len(pool) == 0
+
+    pool=ConnectionPool(min_size=1, max_size=2, timeout=5)
+    results=[]
+
+    def query():
+        with pool.connection() as conn:
+            results.append(conn.execute('SELECT 1;')[0][0])
+
+    threads=[threading.Thread(target=query) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [1] * 8
+    assert 1 <= len(pool) <= 2
+    pool.close()
+
+
+def check_scoped_session(db):
+    session=db.session()
+    assert db.session() is session
+
+    other=[]
+
+    def read():
+        db.session.execute_raw('SELECT 1;')
+        other.append(db.session.active)
+        other.append(db.session())
+
+    thread=threading.Thread(target=read)
+    thread.start()
+    thread.join()
+    assert other[0] is False
+    assert other[1] is not session
+
+    async def child():
+        await asyncio.sleep(0)
+        return db.session()
+
+    async def parent():
+        # aiomysql is only installed with the async extra
+        if aio.aiomysql is not None:
+            await db.session.execute_raw_async('SELECT 1;')
+        active=db.session.active
+        return active, db.session(), await asyncio.gather(child(), child())
+
+    active, task_session, children=asyncio.get_event_loop().run_until_complete(parent())
+    assert active is False
+    assert len({id(s) for s in [session, task_session] + children}) == 4
+
+    with db.session.scope() as scoped:
+        assert scoped is not session
+        assert db.session() is scoped
+    assert db.session() is session
+
+
+def check_schema_expiry(db):
+    Sql.configure_cache(0.05, None)
+    try:
+        db.reflect()
+        time.sleep(0.1)
+        assert Sql.__cache__['tables'].get('Person', None) is None
+        assert JoinedTable.resolve_attribute('Photo', 'Person') == ('photoOwner', 'username')
+        assert 'Photo' in Table('Person').relationships
+        assert db.sql.SELECTFROM('Photo').JOIN('Person').gen()[0].count('`photoOwner`=`Person`.`username`') == 1
+    finally:
+        Sql.configure_cache(
+            DefaultConfig.SQL_CACHE_TIMEOUT,
+            DefaultConfig.SQL_CACHE_SIZE,
+            DefaultConfig.SQL_RESULT_CACHE_TIMEOUT,
+            DefaultConfig.SQL_RESULT_CACHE_SIZE,
+        )
+
+
+def check_schema_snapshot(db):
+    path=os.path.join(tempfile.mkdtemp(), 'schema.json')
+    bigsql.config['SQL_SCHEMA_SNAPSHOT']=path
+    try:
+        schema=db.reflect()
+    finally:
+        bigsql.config['SQL_SCHEMA_SNAPSHOT']=None
+    columns=[col.column_name for col in Table('Metric').columns]
+
+    loaded=Schema.load(path)
+    assert sorted(loaded.columns) == sorted(schema.columns)
+    assert loaded.foreign_keys == schema.foreign_keys
+    assert loaded.join_attributes[('Photo', 'Person')] == ('photoOwner', 'username')
+
+    db.invalidate_all()
+    with statements() as executed:
+        loaded.install()
+        assert [col.column_name for col in Table('Metric').columns] == columns
+        assert JoinedTable.resolve_attribute('Photo', 'Person') == ('photoOwner', 'username')
+    assert not any('INFORMATION_SCHEMA' in sql for sql in executed)
+
+    with open(path, 'w') as f:
+        json.dump({'version': 0}, f)
+    try:
+        Schema.load(path)
+        assert False
+    except Sql.ExpressionError:
+        pass
+
+
+def check_numpy(db):
+    expression=db.sql.SELECT('value', 'amount').FROM('Metric')
+    if columnar.numpy is None:
+        try:
+            expression.to_numpy()
+        except columnar.ColumnarError:
+            return
+        assert False, 'to_numpy should need numpy'
+    columns=expression.to_columns()
+    arrays=expression.to_numpy()
+    assert arrays['value'].dtype == columnar.numpy.float64
+    assert columnar.numpy.ma.isMaskedArray(arrays['value'])
+    assert list(arrays['value'].mask) == list(columns['value'].mask)
+    assert arrays['amount'].dtype == object and len(arrays['amount']) == len(columns['amount'])
+
+
+def photo_ids(db, username):
+    return sorted(photo.photoID for photo in db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).all())
+
+
+def check_operators(db, username):
+    assert db.sql.SELECTFROM('Photo').WHERE(photoID__gt=5, caption__like='%a%').gen() == (
+        'SELECT * FROM `Photo` WHERE `Photo`.`photoID` > %s AND `Photo`.`caption` LIKE %s;', [5, '%a%']
+    )
+    assert db.sql.SELECTFROM('Photo').WHERE(caption__isnull=True, photoID__between=(1, 5)).gen() == (
+        'SELECT * FROM `Photo` WHERE `Photo`.`caption` IS NULL AND `Photo`.`photoID` BETWEEN %s AND %s;', [1, 5]
+    )
+    assert db.sql.SELECTFROM('Photo').WHERE(photoOwner__in=['a', 'b'], photoID__notin=[1]).gen() == (
+        'SELECT * FROM `Photo` WHERE `Photo`.`photoOwner` IN (%s, %s) AND `Photo`.`photoID` NOT IN (%s);', ['a', 'b', 1]
+    )
+    assert db.sql.SELECTFROM('Photo').WHERE(photoOwner='a').OR(photoOwner='b', caption__ne='x').gen() == (
+        'SELECT * FROM `Photo` WHERE `Photo`.`photoOwner` = %s '
+        'OR (`Photo`.`photoOwner` = %s AND `Photo`.`caption` != %s);', ['a', 'b', 'x']
+    )
+    assert db.sql.SELECTFROM('Photo').WHERE(photoOwner='a').ANY(caption__isnull=True, caption='').gen() == (
+        'SELECT * FROM `Photo` WHERE `Photo`.`photoOwner` = %s '
+        'AND (`Photo`.`caption` IS NULL OR `Photo`.`caption` = %s);', ['a', '']
+    )
+
+    split=db.sql.SELECTFROM('Photo').WHERE(photoOwner__in=['a', 'b', 'a', 'c'], caption='x')._split_in(1)
+    assert [e.gen() for e in split] == [
+        ('SELECT * FROM `Photo` WHERE `Photo`.`photoOwner` IN (%s) AND `Photo`.`caption` = %s;', [owner, 'x'])
+        for owner in ('a', 'b', 'c')
+    ]
+    owners=['{:08d}'.format(i) for i in range(100)]
+    split=db.sql.SELECTFROM('Photo').WHERE(photoOwner__in=owners, caption__in=owners[:80])._split_in(4096 + 2000)
+    assert [len(e._conditions[0].value) for e in split] == [20] * 5
+    limited=db.sql.SELECTFROM('Photo').WHERE(photoOwner__in=['a', 'b']).LIMIT(1)
+    assert limited._split_in(1) == [limited]
+    ored=db.sql.SELECTFROM('Photo').WHERE(photoOwner__in=['a', 'b']).OR(photoOwner='c')
+    assert ored._split_in(1) == [ored]
+
+    ids=photo_ids(db, username)
+    assert len(ids) > 1000
+    in_ids=ids + ids[:10]
+    assert db.sql.SELECTFROM('Photo').WHERE(photoID__in=in_ids).count() == len(ids)
+    assert sorted(photo.photoID for photo in db.sql.SELECTFROM('Photo').WHERE(photoID__in=in_ids).all()) == ids
+    assert db.sql.SELECTFROM('Photo').WHERE(photoID__in=in_ids).first().photoID in ids
+    assert db.sql.SELECTFROM('Photo').WHERE(photoID=ids[0]).OR(photoID=ids[1], photoOwner=username).count() == 2
+    blank=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).ANY(caption__isnull=True, caption='').all()
+    assert sorted(photo.photoID for photo in blank) == sorted(
+        photo.photoID for photo in db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).all()
+        if photo.caption in (None, '')
+    )
+
+
+def check_async(db, username):
+    # aiomysql is only installed with the async extra
+    if aio.aiomysql is None:
+        return
+    ids=photo_ids(db, username)
+
+    async def read():
+        photos=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username)
+        assert sorted(photo.photoID for photo in await photos.all_async()) == ids
+        assert (await db.sql.SELECTFROM('Photo').WHERE(photoID__in=ids[::-1]).first_async()).photoID in ids
+        assert await photos.exists_async()
+        assert await photos.count_async() == len(ids)
+        async with db.session.transaction():
+            photo=await db.query('Photo').new_async(photoOwner=username)
+            photo.caption='async'
+        return photo.photoID
+
+    photo_id=asyncio.run(read())
+    # a new event loop gets connections of its own
+    assert asyncio.run(db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).count_async()) == len(ids) + 1
+    assert db.sql.SELECTFROM('Photo').WHERE(photoID=photo_id).first().caption == 'async'
+
+
+def check_stream(db, username):
+    ids=photo_ids(db, username)
+    photos=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username)
+    assert sorted(photo.photoID for photo in photos.iter(batch_size=100, track=False)) == ids
+    assert sorted(row[0] for row in photos.iter(batch_size=100, as_models=False)) == ids
+    assert sorted(db.sql.SELECT('photoID').FROM('Photo').WHERE(photoID__in=ids).iter()) == [(i,) for i in ids]
+    assert len(list(db.query('Photo').stream(batch_size=500, track=False))) == db.query('Photo').count()
+
+
+def check_rows(db, username):
+    ids=photo_ids(db, username)
+    expression=db.sql.SELECT('photoID', 'photoOwner').FROM('Photo').WHERE(photoOwner=username).ORDERBY('photoID')
+    assert expression.tuples() == [(i, username) for i in ids]
+    assert expression.scalars() == ids
+    rows=expression.namedtuples()
+    assert [row.photoID for row in rows] == ids and all(row.photoOwner == username for row in rows)
+    assert type(rows[0]) is type(expression.namedtuples()[0])
+
+    compiled=db.sql.SELECT('photoID').FROM('Photo').WHERE(photoOwner=db.sql.param('owner')).compile()
+    assert sorted(compiled.scalars(owner=username)) == ids
+    assert sorted(compiled.tuples(owner=username)) == [(i,) for i in ids]
+    assert sorted(row.photoID for row in compiled.namedtuples(owner=username)) == ids
+
+
+def check_preload(db, username1, username2):
+    with statements() as executed:
+        people=db.query('Person').preload('photos').WHERE(username__in=[username1, username2]).all()
+        photos={person.username: sorted(photo.photoID for photo in person.photos) for person in people}
+    assert len(people) == 2
+    assert [sql.split(' WHERE ')[0] for sql in executed if sql.startswith('SELECT * FROM')] == [
+        'SELECT * FROM `Person`', 'SELECT * FROM `Photo`'
+    ]
+    assert photos[username1] == photo_ids(db, username1)
+    assert photos[username2] == photo_ids(db, username2)
+
+
+def check_compile(db, username1, username2):
+    expression=db.sql.SELECTFROM('Photo').WHERE(photoOwner=db.sql.param('owner'), photoID__gt=db.sql.param('id'))
+    compiled=expression.compile()
+    assert compiled.sql == 'SELECT * FROM `Photo` WHERE `Photo`.`photoOwner` = %s AND `Photo`.`photoID` > %s;'
+    assert compiled.params == ('owner', 'id')
+    assert compiled.args(owner='a', id=3) == ['a', 3]
+    assert db.sql.SELECTFROM('Photo').WHERE(
+        photoOwner=db.sql.param('owner'), photoID__gt=db.sql.param('id')
+    ).compile() is compiled
+
+    ids=photo_ids(db, username1)
+    compiled=db.sql.SELECTFROM('Photo').WHERE(photoOwner=db.sql.param('owner')).compile()
+    assert len(compiled.all(owner=username1)) == len(ids)
+    assert compiled.first(owner=username1).photoID in ids
+    assert compiled.first(owner=username2) is None
+
+
+def check_paging(db, username):
+    assert db.sql.SELECTFROM('Photo').WHERE(photoOwner='a').LIMIT(10, 20).gen() == (
+        'SELECT * FROM `Photo` WHERE `Photo`.`photoOwner` = %s LIMIT %s OFFSET %s;', ['a', 10, 20]
+    )
+    assert db.sql.SELECTFROM('Photo').ORDERBY('photoID').OFFSET(5).LIMIT(2).gen() == (
+        'SELECT * FROM `Photo` ORDER BY `Photo`.`photoID` LIMIT %s OFFSET %s;', [2, 5]
+    )
+    assert db.sql.SELECTFROM('Photo').WHERE(photoOwner='a').OR(photoOwner='b')._page('photoID', 100, 7).gen() == (
+        'SELECT * FROM `Photo` WHERE (`Photo`.`photoOwner` = %s OR `Photo`.`photoOwner` = %s) '
+        'AND `Photo`.`photoID` > %s ORDER BY `Photo`.`photoID` LIMIT %s;', ['a', 'b', 7, 100]
+    )
+    compiled=db.sql.SELECTFROM('Photo').WHERE(photoOwner=db.sql.param('owner')).compile()
+    assert compiled._compile_first().sql == compiled.sql[:-1] + ' LIMIT %s;'
+
+    ids=photo_ids(db, username)
+    photos=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username)
+    assert photos.first().photoID in ids
+    assert len(photos.all()) == len(ids)
+
+    page=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).ORDERBY('photoID').LIMIT(5, 10).all()
+    assert [photo.photoID for photo in page] == ids[10:15]
+    pages=list(db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).paginate(page_size=400))
+    assert all(len(page) <= 400 for page in pages)
+    assert [photo.photoID for page in pages for photo in page] == ids
+
+    pages=list(db.sql.SELECT('photoID', 'photoOwner').FROM('Photo').WHERE(photoOwner=username).paginate(page_size=400))
+    assert [row for page in pages for row in page] == [(photo_id, username) for photo_id in ids]
+    try:
+        next(db.sql.SELECT('photoOwner').FROM('Photo').paginate())
+        assert False
+    except Sql.ExpressionError:
+        pass
+
+
+def check_aggregates(db, username):
+    photos=db.sql.SELECTFROM('Photo').WHERE(photoOwner='a')
+    assert photos._generate_aggregate('COUNT', '*') == (
+        'SELECT COUNT(*) FROM `Photo` WHERE `Photo`.`photoOwner` = %s', ['a']
+    )
+    assert photos._generate_aggregate('MAX', 'photoID') == (
+        'SELECT MAX(`Photo`.`photoID`) FROM `Photo` WHERE `Photo`.`photoOwner` = %s', ['a']
+    )
+    assert photos._generate_exists() == (
+        'SELECT EXISTS(SELECT * FROM `Photo` WHERE `Photo`.`photoOwner` = %s)', ['a']
+    )
+    assert db.sql.SELECTFROM('Photo').ORDERBY('photoID')._generate_aggregate('COUNT', '*') == (
+        'SELECT COUNT(*) FROM `Photo`', []
+    )
+    assert db.sql.SELECTFROM('Photo').ORDERBY('photoID')._generate_exists() == (
+        'SELECT EXISTS(SELECT * FROM `Photo`)', []
+    )
+    try:
+        photos.aggregate('SUM')
+        assert False
+    except Sql.ExpressionError:
+        pass
+    assert db.sql.SELECTFROM('Photo').GROUPBY('photoOwner')._generate_aggregate('COUNT', '*') == (
+        'SELECT `Photo`.`photoOwner`, COUNT(*) FROM `Photo` GROUP BY `Photo`.`photoOwner`', []
+    )
+    assert db.sql.SELECTFROM('Photo').LIMIT(5)._generate_aggregate('SUM', 'photoID') == (
+        'SELECT SUM(`_rows`.`photoID`) FROM (SELECT `Photo`.`photoID` FROM `Photo` LIMIT %s) AS `_rows`', [5]
+    )
+    assert db.sql.SELECTFROM('Photo').JOIN('Person').LIMIT(5)._generate_aggregate('COUNT', '*') == (
+        'SELECT COUNT(*) FROM (SELECT 1 FROM `Photo` JOIN Person ON `Photo`.`photoOwner`=`Person`.`username` '
+        'LIMIT %s) AS `_rows`', [5]
+    )
+
+    ids=photo_ids(db, username)
+    photos=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username)
+    assert photos.count() == len(ids)
+    assert photos.exists()
+    assert not db.sql.SELECTFROM('Photo').WHERE(photoOwner=username, photoID__lt=0).exists()
+    assert photos.min('photoID') == ids[0] and photos.max('photoID') == ids[-1]
+    assert db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).LIMIT(10).count() == 10
+    assert db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).ORDERBY('photoID').count() == len(ids)
+    assert db.query('Photo').exists(photoOwner=username)
+
+
+def check_grouped_deletes(db, username1, username2):
+    assert list(Sql._generate_delete_many('Tag', ['username', 'photoID'], [('a', 1), ('b', 2)], 4194304)) == [
+        ('DELETE FROM `Tag` WHERE (`Tag`.`username`, `Tag`.`photoID`) IN ((%s, %s), (%s, %s));', ['a', 1, 'b', 2])
+    ]
+    assert list(Sql._generate_delete_many('Photo', ['photoID'], [(1,), (2,)], 1)) == [
+        ('DELETE FROM `Photo` WHERE `Photo`.`photoID` IN (%s);', [1]),
+        ('DELETE FROM `Photo` WHERE `Photo`.`photoID` IN (%s);', [2]),
+    ]
+
+    ids=photo_ids(db, username1)
+    for photo in db.sql.SELECTFROM('Photo').WHERE(photoID__in=ids[:5]).all(raw=False):
+        db.session.delete(photo)
+    db.session.commit()
+    assert db.sql.SELECTFROM('Photo').WHERE(photoOwner=username1).count() == len(ids) - 5
+    assert not db.sql.SELECTFROM('Photo').WHERE(photoID__in=ids[:5]).exists()
+
+    db.query('Person').new(username=username2)
+    db.session.commit()
+    db.sql.INSERT_MANY(
+        {'followerUsername': username1, 'followeeUsername': username2},
+        {'followerUsername': username2, 'followeeUsername': username1},
+    ).INTO('Follow').rowcount()
+    follows=db.sql.SELECTFROM('Follow').WHERE(followerUsername__in=[username1, username2])
+    for follow in follows.all(raw=False):
+        db.session.delete(follow)
+    db.session.commit()
+    assert follows.count() == 0
+
+    photo=db.query('Photo').new(photoOwner=username1)
+    db.session.commit()
+    db.session.delete(photo)
+    assert db.sql.SELECTFROM('Photo').WHERE(photoID=photo.photoID).first(raw=False) is None
+    db.session.rollback()
+    assert db.sql.SELECTFROM('Photo').WHERE(photoID=photo.photoID).first() is not None
+
+    owner=''.join(random.choice(string.ascii_letters) for _ in range(10))
+    person=db.query('Person').new(username=owner)
+    children=[db.query('Photo').new(photoOwner=owner) for _ in range(2)]
+    db.session.commit()
+    with statements() as executed:
+        for photo in children:
+            db.session.delete(photo)
+        db.session.delete(person)
+        db.session.commit()
+    assert [sql.split(' WHERE')[0] for sql in executed if sql.startswith('DELETE')] == [
+        'DELETE FROM `Photo`', 'DELETE FROM `Person`'
+    ]
+
+
+def check_immediate_update(db, username):
+    bigsql.config['SQL_UNIT_OF_WORK']=False
+    try:
+        photo=db.sql.INSERT(photoOwner=username).INTO('Photo').do(raw=False)
+        photo.caption='immediate'
+        db.session.commit()
+        assert db.sql.SELECTFROM('Photo').WHERE(photoID=photo.photoID).first().caption == 'immediate'
+    finally:
+        bigsql.config['SQL_UNIT_OF_WORK']=True
+
+
+def check_unit_of_work(db, username):
+    photo=db.sql.INSERT(photoOwner=username).INTO('Photo').reread().do(raw=False)
+    db.session.commit()
+
+    with statements() as executed:
+        photo.caption='unit'
+        photo.filePath='of work'
+        photo.caption='unit of'
+        assert executed == []
+        db.session.flush()
+    assert len(executed) == 1 and executed[0].startswith('UPDATE `Photo` SET')
+    assert set(re.findall(r'`(\w+)`=%s', executed[0])) == {'caption', 'filePath'}
+    db.session.commit()
+    assert db.sql.SELECTFROM('Photo').WHERE(photoID=photo.photoID).first().caption == 'unit of'
+
+    photo.caption='rolled back'
+    db.session.rollback()
+    assert photo.caption == 'unit of'
+    with statements() as executed:
+        db.session.commit()
+    assert executed == []
+
+
+def check_session_memory(db, username):
+    bigsql.config['SQL_WEAK_IDENTITY_MAP']=True
+    try:
+        with db.session.scope() as session:
+            photo=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).first(raw=False)
+            photo.caption='weak'
+            del photo
+            gc.collect()
+            assert len(list(session.object_tracker)) == 1
+            session.flush()
+            gc.collect()
+            assert len(list(session.object_tracker)) == 0
+    finally:
+        bigsql.config['SQL_WEAK_IDENTITY_MAP']=False
+
+    photo=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).first(raw=False)
+    photo.caption='expunged'
+    db.session.expunge(photo)
+    with statements() as executed:
+        db.session.commit()
+    assert executed == []
+
+    photo.caption='autoflushed'
+    with statements() as executed:
+        db.sql.SELECTFROM('Photo').WHERE(photoID=photo.photoID).first(raw=False)
+    assert executed[0].startswith('UPDATE `Photo`') and executed[1].startswith('SELECT')
+    db.session.rollback()
+
+    bigsql.config['SQL_AUTOFLUSH_LIMIT']=2
+    try:
+        photos=db.sql.SELECTFROM('Photo').WHERE(photoOwner=username).LIMIT(2).all(raw=False)
+        with statements() as executed:
+            photos[0].caption='limit'
+            assert executed == []
+            photos[1].caption='limit'
+        assert len(executed) == 2 and all(sql.startswith('UPDATE `Photo`') for sql in executed)
+    finally:
+        bigsql.config['SQL_AUTOFLUSH_LIMIT']=None
+        db.session.rollback()
 
 
 def test():
@@ -22,7 +577,28 @@ def test():
         db='TS',
     )
 
-    db.create_all()
+    check_registry(db, Test)
+
+    test_cache()
+    check_pool()
+    check_scoped_session(db)
+    check_schema_expiry(db)
+    check_schema_snapshot(db)
+
+    db.reflect()
+    metric={col.column_name: col for col in Table('Metric').columns}
+    assert metric['kind'].type_name == 'enum'
+    assert metric['day'].data_type.name == 'DATE'
+
+    db.sql.INSERT_MANY(
+        {'value': 1.5, 'amount': '2.25'},
+        {'value': None, 'amount': None},
+    ).INTO('Metric').rowcount()
+    columns=db.sql.SELECT('value', 'amount').FROM('Metric').to_columns()
+    assert columns['value'].typecode == 'd'
+    assert columns['value'].nulls >= 1
+    assert columns['amount'].typecode is None
+    check_numpy(db)
 
     username1=''.join(
         random.choice(string.ascii_letters)
@@ -36,6 +612,16 @@ def test():
     admin=db.query('Person').new(username=username1)
     db.session.commit()
 
+    photo=db.sql.INSERT(photoOwner=username1).INTO('Photo').do(raw=False)
+    assert isinstance(photo.photoID, int)
+    photo=db.sql.INSERT(photoOwner=username1).INTO('Photo').reread().do(raw=False)
+    assert isinstance(photo.timestamp, datetime)
+    db.session.rollback()
+    check_immediate_update(db, username1)
+    check_unit_of_work(db, username1)
+    check_session_memory(db, username1)
+    check_result_cache(db, username1)
+
     for _ in range(1000):
         photo=db.query('Photo').new(photoOwner=username1)
         db.session.add(photo)
@@ -57,14 +643,37 @@ def test():
     db.session.commit()
 
     len2=len(list(admin.photos))
+    assert admin.photos is admin.photos
 
     assert len1 != len2
 
+    photos=db.session.bulk_add('Photo', [
+        {'photoOwner': username1}
+        for _ in range(1000)
+    ])
+    db.session.commit()
+
+    assert len(photos) == 1000
+    assert len(set(photo.photoID for photo in photos)) == 1000
+    assert db.session.bulk_add('Photo', [{'photoOwner': username1}] * 10, models=False) == 10
+    db.session.rollback()
+
+    check_operators(db, username1)
+    check_async(db, username1)
+    check_stream(db, username1)
+    check_rows(db, username1)
+    check_compile(db, username1, username2)
+    check_paging(db, username1)
+    check_aggregates(db, username1)
+    check_grouped_deletes(db, username1, username2)
+    check_preload(db, username1, username2)
+
     for _ in range(1000):
         t=Test(a_string='abc')
         db.session.add(t)
 
     db.session.commit()
+    assert not hasattr(t, '__dict__')
 
     for i in Test.query.find(a_string='abc').all():
         i.date = datetime.now()